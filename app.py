@@ -1,17 +1,53 @@
 from flask import Flask
+from bitset_engine import BitsetDiagnosis
 from config import Config
+from diagnosis_cache import DiagnosisCache
+from engine_pool import EnginePool
+from kb_version import KnowledgeBaseWatcher
 from disease_diagnosis import DiseaseDiagnosis
 from disease_info import DiseaseInfo
 from routes import main_routes
 from flask_cors import CORS
+BACKENDS = {
+    'clips': DiseaseDiagnosis,
+    'bitset': BitsetDiagnosis,
+}
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     CORS(app)
-    engine = DiseaseDiagnosis()
+    backend = app.config['DIAGNOSIS_BACKEND']
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown DIAGNOSIS_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}")
+    pool = EnginePool(
+        size=app.config['ENGINE_POOL_SIZE'],
+        timeout=app.config['ENGINE_POOL_TIMEOUT'],
+        max_waiting=app.config['ENGINE_POOL_MAX_WAITING'] or None,
+        log_exhaustion=app.config['ENGINE_POOL_LOG_EXHAUSTION'],
+        full_reload_interval=app.config['ENGINE_FULL_RELOAD_INTERVAL'],
+        sampling=app.config['ENGINE_SAMPLING'],
+        engine_factory=BACKENDS[backend],
+        engine_options={
+            'session_facts': app.config['ENGINE_SESSION_FACTS'],
+            'run_limit': app.config['ENGINE_RUN_LIMIT'] or None,
+            'run_timeout': app.config['ENGINE_RUN_TIMEOUT'] or None,
+        },
+    )
     info = DiseaseInfo()
+    cache = DiagnosisCache(
+        maxsize=app.config['DIAGNOSIS_CACHE_SIZE'],
+        ttl=app.config['DIAGNOSIS_CACHE_TTL'],
+    )
+    # Rule edits made by other processes (the csv-to-clp editor) reach the
+    # engines through the shared version file.
+    kb_watcher = KnowledgeBaseWatcher(
+        pool.dataPath,
+        pool.refresh_rules,
+        interval=app.config['KB_WATCH_INTERVAL'],
+    ).start()
 
-    app.register_blueprint(main_routes(engine, info))
+    app.register_blueprint(main_routes(pool, info, cache, kb_watcher))
 
     return app
 
@@ -0,0 +1,132 @@
+"""Check the bitset backend against CLIPS on random symptom sets, then time both.
+
+    python benchmarks/bitset.py                    # the shipped knowledge base
+    python benchmarks/bitset.py --diseases 20000   # a synthetic one of that size
+
+Exits with status 1 if the two backends ever diagnose different diseases.
+Diseases completed by the same symptom may come back in a different order
+(CLIPS orders those by its join network), so order agreement is reported
+rather than enforced.
+"""
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitset_engine import BitsetDiagnosis
+from disease_diagnosis import DiseaseDiagnosis
+from startup import synthetic_kb
+
+
+@contextlib.contextmanager
+def quiet_stdout():
+    # The printout rules write straight to file descriptor 1 from C.
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def diagnose(engine, symptoms):
+    engine.reset()
+    engine.addSymptoms(symptoms)
+    engine.run()
+    return engine.getDiseases()
+
+
+def symptom_sets(store, count, seed=0):
+    """Mostly a disease's full symptom set plus noise, shuffled; some purely random sets."""
+    rng = random.Random(seed)
+    diseases = [symptoms for _, _, _, symptoms in store.diseases()]
+    vocabulary = store.symptom_names()
+    cases = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            symptoms = list(rng.choice(diseases)) + rng.sample(vocabulary, rng.randint(0, 4))
+        else:
+            symptoms = rng.sample(vocabulary, rng.randint(1, 8))
+        rng.shuffle(symptoms)
+        cases.append(symptoms)
+    return cases
+
+
+def time_engine(engine, cases):
+    timings = []
+    with quiet_stdout():
+        for symptoms in cases:
+            start = time.perf_counter()
+            diagnose(engine, symptoms)
+            timings.append(time.perf_counter() - start)
+    return statistics.mean(timings), sorted(timings)[int(len(timings) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--diseases', type=int, default=0, help="generate a synthetic KB with this many diseases")
+    parser.add_argument('--symptoms', type=int, default=500, help="symptom vocabulary of the synthetic KB")
+    parser.add_argument('--per-disease', type=int, default=6, help="symptoms per synthetic disease")
+    parser.add_argument('--cases', type=int, default=2000)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, 'data')
+        if args.diseases:
+            os.makedirs(data_path)
+            synthetic_kb(os.path.join(data_path, 'disease-symptoms.clp'), args.diseases, args.symptoms, args.per_disease)
+        else:
+            shutil.copytree(os.path.join(root, 'data'), data_path,
+                            ignore=shutil.ignore_patterns('knowledge.db*', 'kb.*', '*.bin', 'feedback.*'))
+        # Both engines read the data directory under the working directory.
+        os.chdir(tmp)
+
+        start = time.perf_counter()
+        clips = DiseaseDiagnosis()
+        clips_load = time.perf_counter() - start
+        start = time.perf_counter()
+        bitset = BitsetDiagnosis()
+        bitset_load = time.perf_counter() - start
+
+        cases = symptom_sets(bitset.store, args.cases)
+        mismatches = same_order = matched = 0
+        with quiet_stdout():
+            for symptoms in cases:
+                expected = diagnose(clips, symptoms)
+                actual = diagnose(bitset, symptoms)
+                matched += bool(expected)
+                if sorted(expected) != sorted(actual):
+                    mismatches += 1
+                    if mismatches <= 5:
+                        print(f"MISMATCH {symptoms}: clips {expected}, bitset {actual}", file=sys.stderr)
+                same_order += expected == actual
+
+        clips_mean, clips_p99 = time_engine(clips, cases)
+        bitset_mean, bitset_p99 = time_engine(bitset, cases)
+
+        print(f"rule file:     {args.diseases or 'shipped'} diseases")
+        print(f"cases:         {len(cases)} ({matched} with a diagnosis)")
+        print(f"equivalent:    {len(cases) - mismatches}/{len(cases)} "
+              f"({same_order} in the same order)")
+        print(f"load:          clips {clips_load * 1000:8.1f} ms   bitset {bitset_load * 1000:8.1f} ms")
+        print(f"mean:          clips {clips_mean * 1e6:8.1f} us   bitset {bitset_mean * 1e6:8.1f} us"
+              f"   ({clips_mean / bitset_mean:.1f}x)")
+        print(f"p99:           clips {clips_p99 * 1e6:8.1f} us   bitset {bitset_p99 * 1e6:8.1f} us")
+        os.chdir(root)
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
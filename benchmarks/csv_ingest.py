@@ -0,0 +1,76 @@
+"""Time CSV ingestion into the knowledge store: first import, unchanged re-import, and a re-import with a few edits.
+
+    python benchmarks/csv_ingest.py                      # 10k, 100k diseases
+    python benchmarks/csv_ingest.py --diseases 500000 --changed 0.01
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_store import KnowledgeStore
+
+
+def synthetic_csv(path, diseases, symptoms, per_disease, changed=0.0, seed=0):
+    rng = random.Random(seed)
+    edits = random.Random(seed + 1)
+    vocabulary = [f"symptom_{i}" for i in range(symptoms)]
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Disease'] + [f"Symptom_{i + 1}" for i in range(per_disease)])
+        for i in range(diseases):
+            row = rng.sample(vocabulary, per_disease)
+            if edits.random() < changed:
+                row[-1] = f"edited_{i}"
+            writer.writerow([f"Disease {i}"] + row)
+
+
+def read_rows(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            yield row[0].replace(" ", "_"), row[1:], row[0]
+
+
+def ingest(store, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    counts = store.upsert_diseases(read_rows(path))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return counts, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--diseases', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--symptoms', type=int, default=500)
+    parser.add_argument('--per-disease', type=int, default=6)
+    parser.add_argument('--changed', type=float, default=0.01, help="fraction of rows edited for the last pass")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'MiB':>7} {'pass':>9} {'s':>8} {'rows/s':>9} {'peak MiB':>9} {'ins':>7} {'upd':>7} {'same':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for diseases in args.diseases:
+            store = KnowledgeStore(os.path.join(tmp, f"kb-{diseases}.db"))
+            original = os.path.join(tmp, f"kb-{diseases}.csv")
+            edited = os.path.join(tmp, f"kb-{diseases}-edited.csv")
+            synthetic_csv(original, diseases, args.symptoms, args.per_disease)
+            synthetic_csv(edited, diseases, args.symptoms, args.per_disease, changed=args.changed)
+            size = os.path.getsize(original) / (1 << 20)
+            for label, path in (('first', original), ('same', original), ('edited', edited)):
+                counts, elapsed, peak = ingest(store, path)
+                print(f"{diseases:>8} {size:>7.1f} {label:>9} {elapsed:>8.2f} {diseases / elapsed:>9.0f} "
+                      f"{peak / (1 << 20):>9.1f} {counts['inserted']:>7} {counts['updated']:>7} {counts['unchanged']:>7}")
+
+
+if __name__ == '__main__':
+    main()
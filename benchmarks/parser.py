@@ -0,0 +1,62 @@
+"""Time the streaming rule parser against the old whole-file regex at growing rule counts.
+
+    python benchmarks/parser.py                          # 1k, 10k, 50k diseases (2 rules each)
+    python benchmarks/parser.py --diseases 1000 100000
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clp_parser import iter_rules
+from startup import synthetic_kb
+
+
+def regex_parse(path):
+    # What rules_helper.parse_rules did before the shared parser.
+    with open(path, 'r') as f:
+        text = f.read()
+    disease_symptoms = {}
+    for disease, rule in re.findall(r'\(defrule is_it_(\w+)(.*?)=>', text, re.DOTALL):
+        disease_symptoms[disease] = set(re.findall(r'\(has_symptom \(name (\w+)\)\)', rule))
+    return disease_symptoms
+
+
+def stream_parse(path):
+    return {rule.disease: set(rule.symptoms) for rule in iter_rules(path) if rule.disease is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--diseases', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--symptoms', type=int, default=500)
+    parser.add_argument('--per-disease', type=int, default=6)
+    args = parser.parse_args()
+
+    print(f"{'rules':>8} {'MiB':>7} {'stream s':>9} {'us/rule':>8} {'regex s':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for diseases in args.diseases:
+            path = os.path.join(tmp, f"kb-{diseases}.clp")
+            synthetic_kb(path, diseases, args.symptoms, args.per_disease)
+
+            start = time.perf_counter()
+            streamed = stream_parse(path)
+            stream_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            regexed = regex_parse(path)
+            regex_time = time.perf_counter() - start
+
+            if streamed != regexed:
+                sys.exit(f"Parsers disagree on {path}")
+            rules = diseases * 2
+            size = os.path.getsize(path) / (1 << 20)
+            print(f"{rules:>8} {size:>7.1f} {stream_time:>9.3f} {stream_time / rules * 1e6:>8.1f} {regex_time:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Compare a full env.reset() per diagnosis against retracting only the session's facts (ENGINE_SESSION_FACTS=1).
+
+    python benchmarks/session_facts.py                          # 1k, 10k and 50k diseases
+    python benchmarks/session_facts.py --diseases 100000 --cases 500
+
+Each size gets a synthetic knowledge base and two engines, one per mode.
+Both run the same symptom sets; the script exits with status 1 if they
+ever diagnose differently. The reset and retract columns are the time
+to clear the previous diagnosis in each mode. The request and session
+columns time the whole reset/assert/run/getDiseases cycle.
+
+Retraction skips the environment-wide work of a reset, but each retracted
+symptom still has to unwind the partial matches it made. Those grow with
+the number of rules using the symptom, so neither mode is flat in the
+size of the knowledge base. On the generated knowledge bases retraction
+is the slower of the two at every size, though the gap narrows as the
+rule count grows; run it on your own rules before turning the mode on.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitset import quiet_stdout
+from disease_diagnosis import DiseaseDiagnosis
+from startup import synthetic_kb
+
+
+def time_mode(engine, cases):
+    between, request = [], []
+    with quiet_stdout():
+        for symptoms in cases:
+            start = time.perf_counter()
+            engine.reset()
+            cleared = time.perf_counter()
+            engine.addSymptoms(symptoms)
+            engine.run()
+            engine.getDiseases()
+            between.append(cleared - start)
+            request.append(time.perf_counter() - start)
+    return statistics.mean(between), statistics.mean(request)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--diseases', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--symptoms', type=int, default=500)
+    parser.add_argument('--per-disease', type=int, default=6)
+    parser.add_argument('--cases', type=int, default=1000)
+    args = parser.parse_args()
+
+    root = os.getcwd()
+    mismatches = 0
+    print(f"{'diseases':>9} {'reset us':>9} {'retract us':>11} {'request us':>11} {'session us':>11}")
+    for diseases in args.diseases:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'data'))
+            synthetic_kb(os.path.join(tmp, 'data', 'disease-symptoms.clp'), diseases, args.symptoms, args.per_disease)
+            # The engines read the data directory under the working directory.
+            os.chdir(tmp)
+            reset_engine = DiseaseDiagnosis()
+            session_engine = DiseaseDiagnosis(session_facts=True)
+
+            rng = random.Random(diseases)
+            vocabulary = session_engine.store.symptom_names()
+            cases = [rng.sample(vocabulary, rng.randint(3, 10)) for _ in range(args.cases)]
+            with quiet_stdout():
+                for symptoms in cases[:200]:
+                    results = []
+                    for engine in (reset_engine, session_engine):
+                        engine.reset()
+                        engine.addSymptoms(symptoms)
+                        engine.run()
+                        results.append(sorted(engine.getDiseases()))
+                    if results[0] != results[1]:
+                        mismatches += 1
+                        print(f"MISMATCH {symptoms}: reset {results[0]}, session {results[1]}", file=sys.stderr)
+
+            reset_between, reset_request = time_mode(reset_engine, cases)
+            session_between, session_request = time_mode(session_engine, cases)
+            print(f"{diseases:>9} {reset_between * 1e6:>9.1f} {session_between * 1e6:>11.1f} "
+                  f"{reset_request * 1e6:>11.1f} {session_request * 1e6:>11.1f}")
+            os.chdir(root)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
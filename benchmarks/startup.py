@@ -0,0 +1,70 @@
+"""Compare cold-start time of parsing disease-symptoms.clp against bloading its binary image.
+
+    python benchmarks/startup.py                   # the shipped knowledge base
+    python benchmarks/startup.py --diseases 20000  # a synthetic one of that size
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clips import Environment
+
+from clp_rules import TEMPLATES, disease_rules
+from kb_image import write_binary_image
+
+
+def synthetic_kb(path, diseases, symptoms, per_disease, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"symptom_{i}" for i in range(symptoms)]
+    with open(path, 'w') as f:
+        f.writelines(TEMPLATES)
+        for i in range(diseases):
+            for rule in disease_rules(f"Disease_{i}", rng.sample(vocabulary, per_disease)):
+                f.write(f"\n{rule}")
+
+
+def time_load(path, binary, repeat):
+    timings = []
+    for _ in range(repeat):
+        env = Environment()
+        start = time.perf_counter()
+        env.load(path, binary=binary)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--diseases', type=int, default=0, help="generate a synthetic KB with this many diseases")
+    parser.add_argument('--symptoms', type=int, default=500, help="symptom vocabulary of the synthetic KB")
+    parser.add_argument('--per-disease', type=int, default=6, help="symptoms per synthetic disease")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clp_path = os.path.join(tmp, 'disease-symptoms.clp')
+        if args.diseases:
+            synthetic_kb(clp_path, args.diseases, args.symptoms, args.per_disease)
+        else:
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            shutil.copy(os.path.join(root, 'data', 'disease-symptoms.clp'), clp_path)
+        image_path = write_binary_image(clp_path)
+
+        text = time_load(clp_path, False, args.repeat)
+        binary = time_load(image_path, True, args.repeat)
+
+        print(f"rule file:    {args.diseases or 'shipped'} diseases ({os.path.getsize(clp_path) / 1024:.0f} KiB)")
+        print(f"text load:    {text * 1000:9.2f} ms")
+        print(f"binary load:  {binary * 1000:9.2f} ms  ({os.path.getsize(image_path) / 1024:.0f} KiB image)")
+        print(f"speedup:      {text / binary:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import logging
+import re
+import time
+
+from clips import Symbol
+
+from clp_parser import fact_value, iter_rules, parse_text
+from clp_rules import TEMPLATES
+from disease_diagnosis import DiseaseDiagnosis, new_environment, release, rule_matches, run_bounded, slot_values
+
+# A constant CLIPS symbol: no variables, wildcards or connective constraints.
+_SYMBOL = re.compile(r'[^\s()&|~?$";<]+$')
+
+
+def compile_rule(rule):
+    """Classify a RuleRecord.
+
+    Returns ('conjunction', disease, symptoms) for rules of the form
+    (has_symptom (name a)) ... => (assert (disease_is (name X))), ('output', None, None)
+    for rules whose only actions are printouts, and ('fallback', None,
+    None) for anything else.
+    """
+    if rule.is_printout:
+        return 'output', None, None
+    actions = rule.actions
+    if len(actions) != 1 or not isinstance(actions[0], list) or len(actions[0]) != 2 or actions[0][0] != 'assert':
+        return 'fallback', None, None
+    disease = fact_value(actions[0][1], 'disease_is')
+    if disease is None or not _SYMBOL.match(disease):
+        return 'fallback', None, None
+    symptoms = []
+    for pattern in rule.patterns:
+        symptom = fact_value(pattern, 'has_symptom')
+        if symptom is None or not _SYMBOL.match(symptom):
+            return 'fallback', None, None
+        symptoms.append(symptom)
+    return 'conjunction', disease, symptoms
+
+
+def _asserts_symptom(rule):
+    return any(isinstance(action, list) and action[:1] == ['assert']
+               and any(fact_value(fact, 'has_symptom') is not None for fact in action[1:])
+               for action in rule.actions)
+
+
+class BitsetDiagnosis(DiseaseDiagnosis):
+    """DiseaseDiagnosis that evaluates conjunctive rules as integer bitmasks instead of through Rete.
+
+    Every symptom gets a bit and every is_it_ rule the mask of its
+    symptoms; a rule fires when its mask is a subset of the asserted
+    symptoms. Rules are checked only from the posting lists of the
+    symptoms actually asserted, so a diagnosis costs about as much as
+    the rules it touches. Diseases come back most recently completed
+    first, as under CLIPS's default depth strategy; rules completed by
+    the same symptom come back in rule-file order.
+
+    Printout-only rules have no effect on the facts and are skipped.
+    Rules of any other shape are built into a small CLIPS environment
+    that is run after the bitmasks, seeded with the symptoms and the
+    diseases found so far, so they still see everything they would
+    under CLIPS alone.
+    """
+
+    backend = 'bitset'
+    uses_binary_image = False
+
+    def load_environment(self):
+        # Compile the same file CLIPS would load, so rules the store can't
+        # represent still reach the fallback environment.
+        self.store.sync_files(self.dataPath)
+        self._compile(list(iter_rules(self.diseasePath)))
+        self.binary_loaded = False
+        self.loaded_at = time.monotonic()
+        self._symptoms = []
+        self._diseases = []
+        self._matched = []
+        logging.info(f"Bitset engine compiled {len(self._masks)} rules, "
+                     f"{len(self._fallback_rules)} left to CLIPS")
+
+    def _compile(self, rules):
+        # name -> RuleRecord for every rule, kept so single-rule rebuilds can recompile the set.
+        self._records = {rule.name: rule for rule in rules}
+        self._bits = {}
+        self._masks = []
+        self._names = []
+        self._rule_names = []
+        self._postings = {}
+        self._always = []
+        self._fallback_rules = []
+        for rule in self._records.values():
+            kind, disease, symptoms = compile_rule(rule)
+            if kind == 'fallback':
+                self._fallback_rules.append(rule)
+                continue
+            if kind != 'conjunction':
+                continue
+            ordinal = len(self._masks)
+            mask = 0
+            for symptom in symptoms:
+                bit = self._bits.setdefault(symptom, len(self._bits))
+                mask |= 1 << bit
+            self._masks.append(mask)
+            self._names.append(disease)
+            self._rule_names.append(rule.name)
+            if not symptoms:
+                self._always.append(ordinal)
+            for symptom in dict.fromkeys(symptoms):
+                self._postings.setdefault(symptom, []).append(ordinal)
+
+        # Fallback rules that assert symptoms are what keeps _run_fallback going round.
+        self._symptom_rules = [rule.name for rule in self._fallback_rules if _asserts_symptom(rule)]
+        self.env = None
+        self.memory_loaded = None
+        self._tracer = None
+        self._tracing = False
+        if self._fallback_rules:
+            self.env = new_environment()
+            for template in TEMPLATES:
+                self.env.build(template)
+            for rule in self._fallback_rules:
+                self.env.build(rule.to_source())
+            self.memory_loaded = self.env.eval('(mem-used)')
+
+    def build_rules(self, rules):
+        """Recompile with the given rule definitions added or replaced."""
+        if not rules:
+            return
+        records = dict(self._records)
+        for source in rules:
+            for rule in parse_text(source):
+                records[rule.name] = rule
+        self._compile(list(records.values()))
+
+    def reset(self):
+        self._trace()
+        self._symptoms = []
+        self._diseases = []
+        if self.env is not None:
+            self.env.reset()
+
+    def addSymptom(self, symptom):
+        self._symptoms.append(symptom)
+
+    def addSymptoms(self, symptoms):
+        self._symptoms.extend(symptoms)
+
+    def run(self, limit=None, timeout=None):
+        """Match the bitmasks, then run any fallback rules within the budget; returns as DiseaseDiagnosis.run."""
+        limit = self.run_limit if limit is None else limit
+        timeout = self.run_timeout if timeout is None else timeout
+        symptoms = list(dict.fromkeys(self._symptoms))
+        # Bitmask rules that fired, kept while sampling; a fallback pass can match them again.
+        self._matched = []
+        diseases = self._match(symptoms)
+        reason = None
+        self.overrun_rules = []
+        if self.env is not None:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            diseases, reason = self._run_fallback(symptoms, diseases, limit, deadline)
+        self._diseases = diseases
+        matched = list(dict.fromkeys(self._matched))
+        self._record_trace(matched, matched)
+        return reason
+
+    def _match(self, symptoms):
+        # (completing step, ordinal) for every rule whose symptoms are all present.
+        fired = [(-1, ordinal) for ordinal in self._always]
+        seen = set(self._always)
+        asserted = 0
+        for step, symptom in enumerate(symptoms):
+            bit = self._bits.get(symptom)
+            if bit is None:
+                continue
+            asserted |= 1 << bit
+            for ordinal in self._postings[symptom]:
+                mask = self._masks[ordinal]
+                if mask & asserted == mask and ordinal not in seen:
+                    seen.add(ordinal)
+                    fired.append((step, ordinal))
+        fired.sort(key=lambda item: (-item[0], item[1]))
+        if self.sampling:
+            self._matched.extend(self._rule_names[ordinal] for _, ordinal in fired)
+        return list(dict.fromkeys(self._names[ordinal] for _, ordinal in fired))
+
+    def _run_fallback(self, symptoms, diseases, limit, deadline):
+        # Repeat until the CLIPS rules stop adding symptoms the bitmasks haven't
+        # seen; the budget covers every pass together.
+        fired = 0
+        while True:
+            has_symptom = self.env.find_template('has_symptom')
+            disease_is = self.env.find_template('disease_is')
+            self.env.reset()
+            release([has_symptom.assert_fact(name=Symbol(symptom)) for symptom in symptoms]
+                    + [disease_is.assert_fact(name=Symbol(disease)) for disease in diseases])
+            count, reason, self.overrun_rules = run_bounded(
+                self.env, None if limit is None else limit - fired, deadline)
+            fired += count
+            found = [str(name) for name in slot_values(disease_is)]
+            if reason is not None:
+                return list(dict.fromkeys(diseases + found)), reason
+            added = [str(name) for name in slot_values(has_symptom) if name not in symptoms]
+            if not added:
+                return list(dict.fromkeys(diseases + found)), None
+            if deadline is not None and time.monotonic() >= deadline:
+                self.overrun_rules = self._symptom_rules
+                return list(dict.fromkeys(diseases + found)), 'deadline'
+            symptoms = symptoms + added
+            diseases = list(dict.fromkeys(diseases + self._match(symptoms)))
+
+    def introspect(self, top=20):
+        """As DiseaseDiagnosis.introspect; memory and partial matches are those of the fallback environment."""
+        fallback = self.env is not None
+        return {
+            'rules': len(self._records),
+            'bitmask_rules': len(self._masks),
+            'fallback_rules': len(self._fallback_rules),
+            'facts': len(set(self._symptoms)) + len(self._diseases),
+            'memory': {
+                'loaded': self.memory_loaded,
+                'after_run': self.memory_after_run,
+                'current': self.env.eval('(mem-used)') if fallback else None,
+            },
+            'partial_matches': rule_matches(self.env, top) if fallback else [],
+        }
+
+    def getDiseases(self):
+        return [disease.replace("_", " ").title() for disease in self._diseases]
+
+    def getSymptoms(self):
+        return [symptom.replace("_", " ").title() for symptom in dict.fromkeys(self._symptoms)]
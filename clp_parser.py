@@ -0,0 +1,246 @@
+"""Single-pass reader for the CLIPS rule files.
+
+The file is read in fixed-size chunks and scanned once for the characters
+that matter to structure (parentheses, string quotes, comments). Each
+top-level construct is cut out as soon as its closing parenthesis is seen
+and parsed on its own, so time is linear in the file size and memory is
+bounded by the largest single rule. Every record keeps the byte range it
+came from, which is what the editors use to rewrite one rule in place.
+"""
+import io
+import os
+import re
+
+CHUNK_SIZE = 1 << 16
+
+_STRUCTURE = re.compile(rb'[()";\\\n]')
+_TOKEN = re.compile(r'"(?:\\.|[^"\\])*"|;[^\n]*|[()]|[^\s()";]+')
+
+
+class RuleRecord:
+    """One defrule: its name, LHS patterns, RHS actions and byte offsets in the file.
+
+    patterns and actions are nested lists of tokens, e.g.
+    ['has_symptom', ['name', 'itching']] and
+    ['assert', ['disease_is', ['name', 'Allergy']]].
+    """
+
+    __slots__ = ('name', 'comment', 'patterns', 'actions', 'start', 'end')
+
+    def __init__(self, name, comment, patterns, actions, start=None, end=None):
+        self.name = name
+        self.comment = comment
+        self.patterns = patterns
+        self.actions = actions
+        self.start = start
+        self.end = end
+
+    @property
+    def disease(self):
+        """Disease diagnosed by an is_it_ rule, None for any other rule."""
+        if self.name.startswith('is_it_'):
+            return self.name[len('is_it_'):]
+        return None
+
+    @property
+    def is_printout(self):
+        """True for a companion rule whose only actions are printouts; it never changes the facts."""
+        return bool(self.actions) and all(
+            isinstance(action, list) and action[:1] == ['printout'] for action in self.actions)
+
+    @property
+    def symptoms(self):
+        values = (fact_value(pattern, 'has_symptom') for pattern in self.patterns)
+        return [value for value in values if value is not None]
+
+    def to_source(self):
+        """Render the rule in the layout the generators use."""
+        lines = [f"(defrule {self.name}"]
+        if self.comment:
+            lines.append(f"  {self.comment}")
+        lines.extend(f"  {_render(pattern)}" for pattern in self.patterns)
+        lines.append("  =>")
+        lines.extend(f"  {_render(action)}" for action in self.actions)
+        lines.append(")")
+        return "\n".join(lines) + "\n"
+
+    def __repr__(self):
+        return f"RuleRecord({self.name!r}, patterns={self.patterns!r}, start={self.start}, end={self.end})"
+
+
+def fact_value(expression, template):
+    """The symptom or disease in a (template (name x)) fact or pattern, None for anything else.
+
+    Files written before the deftemplates used ordered facts,
+    (template x); those are read the same way.
+    """
+    if not (isinstance(expression, list) and len(expression) == 2 and expression[0] == template):
+        return None
+    value = expression[1]
+    if isinstance(value, list):
+        if len(value) == 2 and value[0] == 'name' and isinstance(value[1], str):
+            return value[1]
+        return None
+    return value
+
+
+def _render(expression):
+    if isinstance(expression, list):
+        return "(" + " ".join(_render(item) for item in expression) + ")"
+    return expression
+
+
+def _parse_expression(text):
+    """Parse one construct's source into nested lists of tokens."""
+    stack = [[]]
+    for token in _TOKEN.findall(text):
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            if len(stack) == 1:
+                raise ValueError("Unbalanced ')' in rule source")
+            finished = stack.pop()
+            stack[-1].append(finished)
+        elif token.startswith(';'):
+            continue
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1 or len(stack[0]) != 1:
+        raise ValueError("Rule source is not a single balanced expression")
+    return stack[0][0]
+
+
+def _rule_from_construct(construct, start, end):
+    if len(construct) < 2 or construct[0] != 'defrule':
+        return None
+    body = construct[2:]
+    comment = None
+    if body and isinstance(body[0], str) and body[0].startswith('"'):
+        comment = body.pop(0)
+    try:
+        arrow = body.index('=>')
+    except ValueError:
+        return None
+    return RuleRecord(construct[1], comment, body[:arrow], body[arrow + 1:], start, end)
+
+
+def iter_constructs(source, chunk_size=CHUNK_SIZE):
+    """Yield (start, end, source bytes) for every top-level construct in a binary file object."""
+    depth = 0
+    in_string = False
+    in_comment = False
+    # Absolute offset of a byte escaped by a backslash inside a string.
+    escaped = -1
+    construct_start = None
+    pieces = []
+    offset = 0
+
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        piece_from = 0
+        for match in _STRUCTURE.finditer(chunk):
+            position = match.start()
+            if offset + position == escaped:
+                continue
+            char = chunk[position]
+            if in_comment:
+                if char == 0x0A:
+                    in_comment = False
+            elif in_string:
+                if char == 0x5C:
+                    escaped = offset + position + 1
+                elif char == 0x22:
+                    in_string = False
+            elif char == 0x3B:
+                in_comment = True
+            elif char == 0x22:
+                in_string = True
+            elif char == 0x28:
+                if depth == 0:
+                    construct_start = offset + position
+                    pieces = []
+                    piece_from = position
+                depth += 1
+            elif char == 0x29 and depth > 0:
+                depth -= 1
+                if depth == 0:
+                    pieces.append(chunk[piece_from:position + 1])
+                    yield construct_start, offset + position + 1, b"".join(pieces)
+                    construct_start = None
+                    pieces = []
+        if construct_start is not None:
+            pieces.append(chunk[piece_from:])
+        offset += len(chunk)
+
+
+def iter_rules(path, chunk_size=CHUNK_SIZE):
+    """Stream the defrules of a .clp file as RuleRecords, in file order."""
+    with open(path, 'rb') as source:
+        for start, end, raw in iter_constructs(source, chunk_size):
+            rule = _rule_from_construct(_parse_expression(raw.decode('utf-8')), start, end)
+            if rule is not None:
+                yield rule
+
+
+def declares_templates(path):
+    """True if the file has any deftemplate, i.e. its rules use template facts rather than ordered ones."""
+    with open(path, 'rb') as source:
+        return any(raw[1:].lstrip().startswith(b'deftemplate') for _, _, raw in iter_constructs(source))
+
+
+def parse_text(text):
+    """Parse CLIPS source held in memory; offsets are into its UTF-8 encoding."""
+    for start, end, raw in iter_constructs(io.BytesIO(text.encode('utf-8'))):
+        rule = _rule_from_construct(_parse_expression(raw.decode('utf-8')), start, end)
+        if rule is not None:
+            yield rule
+
+
+def replace_ranges(path, edits):
+    """Rewrite path with byte ranges replaced, in one streaming pass.
+
+    edits is a list of (start, end, new_text); an empty range inserts and
+    empty text deletes. The result is written to a temporary file and
+    renamed over the original, so readers never see a partial file.
+    """
+    edits = sorted(edits, key=lambda edit: (edit[0], edit[1]))
+    tmp_path = path + '.tmp'
+    with open(path, 'rb') as source, open(tmp_path, 'wb') as target:
+        position = 0
+        for start, end, new_text in edits:
+            if start < position:
+                raise ValueError("Overlapping edits")
+            _copy(source, target, start - position)
+            target.write(new_text.encode('utf-8'))
+            source.seek(end)
+            position = end
+        _copy(source, target, None)
+    os.replace(tmp_path, path)
+
+
+def strip_printout_rules(path):
+    """Delete every printout-only rule from path, with the blank lines after it; returns how many."""
+    ranges = []
+    with open(path, 'rb') as source:
+        for rule in iter_rules(path):
+            if not rule.is_printout:
+                continue
+            source.seek(rule.end)
+            trailing = source.read(64)
+            end = rule.end + len(trailing) - len(trailing.lstrip(b" \t\r\n"))
+            ranges.append((rule.start, end, ''))
+    if ranges:
+        replace_ranges(path, ranges)
+    return len(ranges)
+
+
+def _copy(source, target, length):
+    while length is None or length > 0:
+        chunk = source.read(CHUNK_SIZE if length is None else min(CHUNK_SIZE, length))
+        if not chunk:
+            return
+        target.write(chunk)
+        if length is not None:
+            length -= len(chunk)
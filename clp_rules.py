@@ -0,0 +1,37 @@
+import re
+
+# Fact schema every rule file starts with; symptoms and diseases are one symbol slot each.
+TEMPLATES = (
+    "(deftemplate has_symptom (slot name))\n",
+    "(deftemplate disease_is (slot name))\n",
+)
+
+
+def disease_rules(disease_name, symptoms, display_name=None):
+    """Return the companion printout rule and the is_it_ rule for a disease, as CLIPS source."""
+    if display_name is None:
+        display_name = disease_name.replace('_', ' ')
+
+    printout_rule = (
+        f"(defrule {disease_name}\n"
+        f"  (disease_is (name {disease_name}))\n"
+        f"  =>\n"
+        f"  (printout t \"{display_name}\" crlf)\n"
+        f")\n"
+    )
+
+    symptom_lines = "".join(f"  (has_symptom (name {symptom}))\n" for symptom in symptoms)
+    is_it_rule = (
+        f"(defrule is_it_{disease_name}\n"
+        f"{symptom_lines}"
+        f"  =>\n"
+        f"  (assert (disease_is (name {disease_name})))\n"
+        f")\n"
+    )
+    return printout_rule, is_it_rule
+
+
+def rule_name(rule):
+    """Name of the defrule in a piece of CLIPS source."""
+    match = re.match(r'\s*\(defrule\s+([^\s()]+)', rule)
+    return match.group(1) if match else None
@@ -2,3 +2,40 @@ import os
 
 class Config:
     SECRET_KEY = os.urandom(24).hex()
+
+    # Number of preloaded CLIPS environments shared by request threads.
+    ENGINE_POOL_SIZE = int(os.environ.get('ENGINE_POOL_SIZE', 4))
+    # Seconds a request waits for a free engine before giving up with a 503.
+    ENGINE_POOL_TIMEOUT = float(os.environ.get('ENGINE_POOL_TIMEOUT', 5))
+    # Requests that may queue for an engine; beyond that they get an immediate 503 (0 disables).
+    ENGINE_POOL_MAX_WAITING = int(os.environ.get('ENGINE_POOL_MAX_WAITING', 64))
+    # Log a warning every time the pool runs out of engines.
+    ENGINE_POOL_LOG_EXHAUSTION = os.environ.get('ENGINE_POOL_LOG_EXHAUSTION', '1') == '1'
+    # Rule edits are built into live engines one rule at a time; every this
+    # many seconds an engine reparses the whole file as a consistency check.
+    ENGINE_FULL_RELOAD_INTERVAL = float(os.environ.get('ENGINE_FULL_RELOAD_INTERVAL', 3600))
+    # Retract the previous diagnosis's facts between requests instead of
+    # resetting the whole CLIPS environment. Off by default: it measured
+    # slower than a reset in benchmarks/session_facts.py.
+    ENGINE_SESSION_FACTS = os.environ.get('ENGINE_SESSION_FACTS', '0') == '1'
+    # Most rules one diagnosis may fire before it is cut short (0 disables).
+    ENGINE_RUN_LIMIT = int(os.environ.get('ENGINE_RUN_LIMIT', 10000))
+    # Seconds one diagnosis may run its rules before it is cut short (0 disables).
+    ENGINE_RUN_TIMEOUT = float(os.environ.get('ENGINE_RUN_TIMEOUT', 2))
+    # Count every rule activation and firing for /debug/engine from startup; it can be switched there too.
+    ENGINE_SAMPLING = os.environ.get('ENGINE_SAMPLING', '0') == '1'
+    # Inference backend: 'clips' runs every rule through CLIPS, 'bitset' evaluates
+    # the plain symptom-conjunction rules as bitmasks and leaves the rest to CLIPS.
+    DIAGNOSIS_BACKEND = os.environ.get('DIAGNOSIS_BACKEND', 'clips')
+    # Seconds between checks for rule edits made by other processes (0 disables).
+    KB_WATCH_INTERVAL = float(os.environ.get('KB_WATCH_INTERVAL', 1))
+
+    # Most distinct symptom sets whose diagnosis is kept in memory (0 disables the cache).
+    DIAGNOSIS_CACHE_SIZE = int(os.environ.get('DIAGNOSIS_CACHE_SIZE', 1024))
+    # Seconds a cached diagnosis stays valid (0 keeps it until evicted or the KB changes).
+    DIAGNOSIS_CACHE_TTL = float(os.environ.get('DIAGNOSIS_CACHE_TTL', 300))
+
+    # Largest number of symptom sets accepted by /diagnose/batch.
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 10000))
+    # Upper bound on the engines a single batch may fan out across.
+    BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))
@@ -9,14 +9,18 @@ const clpNote = `; -------------------------------------------------------------
 ; this file is generated using node-js
 ; dataset: https://www.kaggle.com/itachi9604/disease-symptom-description-dataset
 ; ------------------------------------------------------------------------------
+
+(deftemplate has_symptom (slot name))
+(deftemplate disease_is (slot name))
 `;
 
 writer.write(clpNote);
 
 const allSymptoms = new Set();
+const diseases = [];
 let lineNumber = 0;
 
-// Write Each Line
+// Read Each Line
 rl.on("line", (row) => {
   lineNumber++;
   if (lineNumber === 1) return;
@@ -30,27 +34,46 @@ rl.on("line", (row) => {
     symptoms: line.slice(1, 5).map((symptom) => symptom.replaceAll(" ", "")),
   };
 
-  const clpFormat = `
+  diseases.push(disease);
+
+  // Inspect what symptoms
+  disease.symptoms.forEach((symptom) => allSymptoms.add(symptom));
+});
+
+// CLP_PATTERN_ORDER=rarest lists each rule's symptoms by how many rules use them, fewest first
+const orderSymptoms = (symptoms, frequency) =>
+  process.env.CLP_PATTERN_ORDER === "rarest"
+    ? [...symptoms].sort((a, b) => frequency.get(a) - frequency.get(b))
+    : symptoms;
+
+rl.on("close", () => {
+  const frequency = new Map();
+  diseases.forEach((disease) =>
+    new Set(disease.symptoms).forEach((symptom) => frequency.set(symptom, (frequency.get(symptom) || 0) + 1))
+  );
+
+  // Write Each Disease
+  diseases.forEach((disease) => {
+    // CLP_PRINTOUT_RULES=0 leaves out the companion printout rule
+    const printoutRule = process.env.CLP_PRINTOUT_RULES === "0" ? "" : `
 (defrule ${disease.nameWithUnderscore}
-  (disease_is ${disease.nameWithUnderscore})
+  (disease_is (name ${disease.nameWithUnderscore}))
   =>
   (printout t "${disease.name}" crlf)
 )
-
+`;
+    const clpFormat = `${printoutRule}
 (defrule is_it_${disease.nameWithUnderscore}
-  ${disease.symptoms.map((symptom) => `(has_symptom ${symptom})`).join("\n  ")}
+  ${orderSymptoms(disease.symptoms, frequency).map((symptom) => `(has_symptom (name ${symptom}))`).join("\n  ")}
   =>
-  (assert (disease_is ${disease.nameWithUnderscore}))
+  (assert (disease_is (name ${disease.nameWithUnderscore})))
 )
   `;
 
-  writer.write(clpFormat);
-
-  // Inspect what symptoms
-  disease.symptoms.forEach((symptom) => allSymptoms.add(symptom));
-});
+    writer.write(clpFormat);
+  });
+  writer.end();
 
-rl.on("close", () => {
   const symptomsWriter = fs.createWriteStream("../data/symptoms.txt");
   symptomsWriter.write([...allSymptoms].sort().join(",\n"));
 });
@@ -1,10 +1,23 @@
 from flask import Flask, request, jsonify
 import os
+import sys
 import csv
+import time
 import traceback
+import uuid
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 
+# Shared knowledge-base helpers live in the project root, one level up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from kb_index import KnowledgeBaseIndex
+from kb_image import refresh_binary_image
+from feedback import FeedbackAggregator
+from jobs import JobQueue
+from kb_version import bump_version
+from knowledge_store import check_name, disease_key, open_store
+from metrics import CONTENT_TYPE, Histogram, render, time_requests
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
@@ -19,7 +32,15 @@ CORS(app)  # Enable CORS for all routes
 
 app.config['UPLOAD_FOLDER'] = 'uploads/'
 app.config['ALLOWED_EXTENSIONS'] = {'csv'}
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limit upload size to 16MB
+# Uploads are streamed to disk and imported in batches, so large files are fine
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 512)) * 1024 * 1024
+
+# Largest number of edits accepted by one /api/kb/batch request
+BATCH_MAX_OPERATIONS = 10000
+# Reports of the same missed symptom needed before it is added to a disease's rule
+FEEDBACK_SUPPORT_THRESHOLD = int(os.environ.get('FEEDBACK_SUPPORT_THRESHOLD', 3))
+# Seconds between passes that fold feedback into the rules
+FEEDBACK_APPLY_INTERVAL = float(os.environ.get('FEEDBACK_APPLY_INTERVAL', 60))
 
 # Output paths (absolute)
 UPLOAD_DIR_ABS = os.path.abspath(app.config['UPLOAD_FOLDER'])
@@ -32,130 +53,161 @@ print(f"DEBUG: DATA directory path: {DATA_DIR_ABS}")
 print(f"DEBUG: CLP file path: {CLP_FILE_PATH}")
 print(f"DEBUG: Symptoms file path: {SYMPTOMS_FILE_PATH}")
 
+# The knowledge store is the source of truth; the CLP and symptoms files are generated from it
+store = open_store(DATA_DIR_ABS)
+# Diseases by stable ID, rebuilt only when the store changes
+kb_index = KnowledgeBaseIndex(store, DATA_DIR_ABS)
+# CSV imports run here, one at a time, instead of inside the upload request
+jobs = JobQueue()
+
+# Latency histograms served at /metrics: every request, and the steps of publishing a rule edit
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time to handle a request.', 'endpoint')
+PUBLISH_SECONDS = Histogram('kb_publish_phase_seconds', 'Time spent in each step of publishing a rule edit.', 'phase')
+time_requests(app, REQUEST_SECONDS)
+
 
 def allowed_file(filename):
     print(f"DEBUG: Checking if file {filename} is allowed")
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
-def convert_csv_to_clp(csv_path, clp_output_path, symptoms_output_path):
-    """Convert CSV data to CLIPS rule format and append to existing file if present"""
+def publish_changes(rule_names):
+    """Regenerate the rule files from the store and tell the other services which rules changed"""
+    watch = PUBLISH_SECONDS.stopwatch()
+    rewritten = store.sync_files(DATA_DIR_ABS)
+    watch.lap('sync')
+    if rewritten:
+        refresh_binary_image(CLP_FILE_PATH)
+        watch.lap('image')
+    version = bump_version(DATA_DIR_ABS, rule_names)
+    watch.lap('version')
+    return version
+
+
+# Feedback is logged per request and applied to the rules in periodic batches
+feedback = FeedbackAggregator(store, DATA_DIR_ABS, publish_changes,
+                              threshold=FEEDBACK_SUPPORT_THRESHOLD, interval=FEEDBACK_APPLY_INTERVAL).start()
+
+
+def read_csv_diseases(csvfile, stats):
+    """Yield (name, symptoms, display_name) for each usable CSV row, counting rows into stats"""
+    csv_reader = csv.reader(csvfile)
+    next(csv_reader, None)  # Skip header row
+
+    for row in csv_reader:
+        stats['rows'] += 1
+        line = [item.strip() for item in row if item.strip()]
+        if not line:
+            stats['skipped'] += 1
+            continue
+
+        # Every symptom column counts, in order, without duplicates
+        symptoms = list(dict.fromkeys(symptom.replace(" ", "") for symptom in line[1:]))
+        if not symptoms:
+            stats['skipped'] += 1
+            continue
+
+        # A name the rules can't hold would fail the whole batch it lands in
+        try:
+            name = check_name(line[0].replace(" ", "_"))
+            for symptom in symptoms:
+                check_name(symptom)
+        except ValueError:
+            stats['skipped'] += 1
+            continue
+
+        yield name, symptoms, line[0]
+
+
+def publish_upserted(counts):
+    """Publish the diseases an upsert inserted or updated; returns the new version, or None if nothing changed"""
+    if not counts['inserted'] and not counts['updated']:
+        return None
+    changed = counts['changed']
+    if changed is not None:
+        changed = [rule for name in changed for rule in (name, f"is_it_{name}")]
+    return publish_changes(changed)
+
+
+def convert_csv_to_clp(csv_path, stats=None):
+    """Stream CSV diseases into the knowledge store, regenerating the CLIPS rules only if something changed
+
+    stats is updated in place as rows are read and batches are committed,
+    so a caller on another thread can follow the progress.
+    """
     print(f"DEBUG: Starting conversion from CSV to CLP")
     print(f"DEBUG: Input CSV: {csv_path}")
-    print(f"DEBUG: Output CLP: {clp_output_path}")
-    print(f"DEBUG: Output symptoms: {symptoms_output_path}")
-
-    # Create output directories if they don't exist
-    os.makedirs(os.path.dirname(clp_output_path), exist_ok=True)
-    os.makedirs(os.path.dirname(symptoms_output_path), exist_ok=True)
-
-    clp_note = """; ------------------------------------------------------------------------------
-; this file is generated using Python
-; dataset: https://www.kaggle.com/itachi9604/disease-symptom-description-dataset
-; ------------------------------------------------------------------------------
-"""
-
-    # Collect all symptoms (start with existing ones if available)
-    all_symptoms = set()
-    diseases_processed = 0
-
-    # Load existing symptoms if symptoms file exists
-    if os.path.exists(symptoms_output_path):
-        print(f"DEBUG: Loading existing symptoms from {symptoms_output_path}")
-        try:
-            with open(symptoms_output_path, 'r') as symptoms_file:
-                existing_symptoms = symptoms_file.read().split(",\n")
-                all_symptoms.update([s for s in existing_symptoms if s])
-                print(f"DEBUG: Loaded {len(all_symptoms)} existing symptoms")
-        except Exception as e:
-            print(f"WARNING: Error loading existing symptoms: {str(e)}")
-
-    # Check if CLP file exists and determine write mode
-    file_exists = os.path.exists(clp_output_path)
-    open_mode = 'a' if file_exists else 'w'
-    print(f"DEBUG: CLP file {'exists' if file_exists else 'does not exist'}, opening in {open_mode} mode")
 
-    try:
-        with open(csv_path, 'r') as csvfile:
-            # Read CSV data
-            print(f"DEBUG: Reading CSV file: {csv_path}")
-            csv_reader = csv.reader(csvfile)
-            next(csv_reader)  # Skip header row
-            print("DEBUG: Skipped header row")
-
-            with open(clp_output_path, open_mode) as clp_file:
-                # Write the header note only if creating a new file
-                if not file_exists:
-                    clp_file.write(clp_note)
-                    print("DEBUG: Wrote header note to new CLP file")
-
-                for line_number, row in enumerate(csv_reader, 1):
-                    print(f"DEBUG: Processing row {line_number}: {row}")
-                    line = [item.strip() for item in row if item.strip()]
-                    print(f"DEBUG: Cleaned line: {line}")
-
-                    if not line:
-                        print("DEBUG: Empty line, skipping")
-                        continue
-
-                    disease = {
-                        "name": line[0],
-                        "nameWithUnderscore": line[0].replace(" ", "_"),
-                        "symptoms": [symptom.replace(" ", "") for symptom in line[1:5] if symptom.strip()]
-                    }
-                    print(f"DEBUG: Disease object created: {disease}")
-
-                    if not disease["symptoms"]:
-                        print("DEBUG: No symptoms found, skipping disease")
-                        continue
-
-                    # Format exactly like in JS
-                    symptoms_text = "\n  ".join([f"(has_symptom {symptom})" for symptom in disease["symptoms"]])
-                    print(f"DEBUG: Formatted symptoms: {symptoms_text}")
-
-                    clp_format = f"""
-(defrule {disease["nameWithUnderscore"]}
-  (disease_is {disease["nameWithUnderscore"]})
-  =>
-  (printout t "{disease["name"]}" crlf)
-)
-
-(defrule is_it_{disease["nameWithUnderscore"]}
-  {symptoms_text}
-  =>
-  (assert (disease_is {disease["nameWithUnderscore"]}))
-)
-  """
-                    print(f"DEBUG: Appending CLP rule for {disease['name']}")
-                    clp_file.write(clp_format)
-                    diseases_processed += 1
-
-                    # Add to symptoms set
-                    for symptom in disease["symptoms"]:
-                        all_symptoms.add(symptom)
-
-                print(f"DEBUG: Processed {diseases_processed} diseases in total")
-
-        # Write symptoms file (always overwrite to ensure consistency)
-        print(f"DEBUG: Writing {len(all_symptoms)} symptoms to {symptoms_output_path}")
-        with open(symptoms_output_path, 'w') as symptoms_file:
-            symptoms_file.write(",\n".join(sorted(all_symptoms)))
-            print("DEBUG: Symptoms file written successfully")
+    if stats is None:
+        stats = {}
+    stats.update({'rows': 0, 'skipped': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0})
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'changed': []}
+
+    def committed(result):
+        counts.update(result)
+        stats.update(inserted=result['inserted'], updated=result['updated'], unchanged=result['unchanged'])
 
+    try:
+        started = time.perf_counter()
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as csvfile:
+            # Rows are read and written in batches, so memory stays flat however large the file is
+            store.upsert_diseases(read_csv_diseases(csvfile, stats), on_batch=committed)
+        elapsed = time.perf_counter() - started
+        print(f"DEBUG: Read {stats['rows']} rows ({stats['skipped']} skipped) in {elapsed:.2f}s: "
+              f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged")
+
+        version = publish_upserted(counts)
+        if version is None:
+            print("DEBUG: Nothing changed, rules left as they are")
+        else:
+            print(f"DEBUG: Rules regenerated in {DATA_DIR_ABS}, knowledge base version {version}")
+
+        all_symptoms = store.symptom_names()
         result = {
-            'diseases_count': diseases_processed,
+            'rows': stats['rows'],
+            'skipped': stats['skipped'],
+            'inserted': counts['inserted'],
+            'updated': counts['updated'],
+            'unchanged': counts['unchanged'],
+            'diseases_count': counts['inserted'] + counts['updated'] + counts['unchanged'],
             'symptoms_count': len(all_symptoms),
-            'symptoms': sorted(list(all_symptoms))[:10]  # Return first 10 for preview
+            'symptoms': all_symptoms[:10],  # Return first 10 for preview
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(stats['rows'] / elapsed) if elapsed else stats['rows'],
+            'version': version
         }
-        print(f"DEBUG: Conversion completed with result: {result}")
         return result
     except Exception as e:
         print(f"ERROR: Exception in convert_csv_to_clp: {str(e)}")
         print(traceback.format_exc())
+        # Batches committed before the failure are already in the store; publish them
+        publish_upserted(counts)
         error_message = f"Error converting CSV to CLP: {str(e)}"
         raise ValueError(error_message)
 
 
+def run_upload_job(progress, csv_path):
+    """Job body for an uploaded CSV: convert it, then delete the upload"""
+    try:
+        result = convert_csv_to_clp(csv_path, progress)
+    finally:
+        os.remove(csv_path)
+    return {
+        'message': f'{result["inserted"]} diseases added, {result["updated"]} updated and {result["unchanged"]} unchanged; {result["symptoms_count"]} unique symptoms.',
+        'diseasesCount': result["diseases_count"],
+        'symptomsCount': result["symptoms_count"],
+        'symptomsSample': result["symptoms"],
+        'rows': result["rows"],
+        'skippedRows': result["skipped"],
+        'inserted': result["inserted"],
+        'updated': result["updated"],
+        'unchanged': result["unchanged"],
+        'seconds': result["seconds"],
+        'rowsPerSecond': result["rows_per_second"],
+        'version': result["version"]
+    }
+
+
 @app.route('/', methods=['GET'])
 def index():
     print("DEBUG: Root endpoint accessed")
@@ -182,20 +234,7 @@ def process_feedback():
 
         # Convert disease name to expected format in rules
         rule_disease_name = disease_name.replace(' ', '_')
-
-        # Path to the rules file
-        clp_file_path = CLP_FILE_PATH
-
-        # Read the current file content
-        with open(clp_file_path, 'r') as file:
-            content = file.read()
-
-        # Find the disease rule
-        import re
-        pattern = rf'(\(defrule is_it_{rule_disease_name}\s*[^=]*=>)'
-        rule_match = re.search(pattern, content, re.DOTALL)
-
-        if not rule_match:
+        if store.disease(rule_disease_name) is None:
             return jsonify({
                 'status': 'error',
                 'message': f'Disease rule for {disease_name} not found'
@@ -203,28 +242,22 @@ def process_feedback():
 
         # Process the symptoms to add - properly handle comma separated values
         raw_symptoms = [s.strip() for s in missed_symptoms.split(',') if s.strip()]
-        # Format symptoms according to CLIPS rules (replace spaces with nothing, add suffix '1')
+        # Format symptoms according to CLIPS rules (replace spaces with nothing)
         symptoms_to_add = [f"{symptom.replace(' ', '')}" for symptom in raw_symptoms]
+        try:
+            for symptom in symptoms_to_add:
+                check_name(symptom)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
 
-        # Generate symptom lines to add
-        symptom_lines = '\n  '.join([f"(has_symptom {symptom})" for symptom in symptoms_to_add])
-
-        # Insert the new symptoms before the "=>" part
-        current_rule = rule_match.group(1)
-        insertion_point = current_rule.rfind(')')
-        updated_rule = current_rule[:insertion_point + 1] + f"\n  {symptom_lines}" + current_rule[insertion_point + 1:]
-
-        # Replace the old rule with the updated one
-        updated_content = content.replace(rule_match.group(1), updated_rule)
-
-        # Write the updated content back to the file
-        with open(clp_file_path, 'w') as file:
-            file.write(updated_content)
+        # Log the report; symptoms reach the rule once enough reports agree
+        feedback.record(rule_disease_name, symptoms_to_add)
 
         return jsonify({
             'status': 'success',
-            'message': f'Added {len(symptoms_to_add)} symptoms to {disease_name}',
-            'added_symptoms': symptoms_to_add
+            'message': f'Feedback recorded; {len(symptoms_to_add)} symptoms will be added to {disease_name} '
+                       f'once {FEEDBACK_SUPPORT_THRESHOLD} reports agree',
+            'reported_symptoms': symptoms_to_add
         })
 
     except Exception as e:
@@ -233,6 +266,23 @@ def process_feedback():
             'status': 'error',
             'message': str(e)
         }), 500
+
+
+@app.route('/api/feedback/suggestions', methods=['GET'])
+def feedback_suggestions():
+    """Missed symptoms reported by users that are not in the rules yet, best supported first"""
+    try:
+        limit = request.args.get('limit')
+        limit = max(int(limit), 0) if limit is not None else None
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({
+        'threshold': FEEDBACK_SUPPORT_THRESHOLD,
+        'applied': feedback.applied,
+        'suggestions': feedback.suggestions(limit)
+    }), 200
+
+
 @app.route('/api/healthcheck', methods=['GET'])
 def healthcheck():
     """Health check endpoint to verify server status"""
@@ -271,8 +321,8 @@ def upload_csv():
         os.makedirs(UPLOAD_DIR_ABS, exist_ok=True)
         print(f"DEBUG: Upload directory ensured: {UPLOAD_DIR_ABS}")
 
-        # Secure and save the file
-        filename = secure_filename(file.filename)
+        # Secure and save the file under a unique name, so queued uploads of the same file don't clash
+        filename = f"{uuid.uuid4().hex}-{secure_filename(file.filename)}"
         file_path = os.path.join(UPLOAD_DIR_ABS, filename)
         file.save(file_path)
         print(f"DEBUG: File saved at: {file_path}")
@@ -286,24 +336,24 @@ def upload_csv():
         print(f"DEBUG: File size: {file_size} bytes")
         if file_size == 0:
             print("ERROR: Uploaded file is empty")
+            os.remove(file_path)
             return jsonify({'message': 'File upload failed or file is empty'}), 400
 
-        # Process the CSV file and generate CLIPS rules
+        # Process the CSV file and generate CLIPS rules in the background
         os.makedirs(DATA_DIR_ABS, exist_ok=True)
         print(f"DEBUG: Data directory ensured: {DATA_DIR_ABS}")
 
-        print("DEBUG: Starting CSV to CLP conversion")
-        result = convert_csv_to_clp(file_path, CLP_FILE_PATH, SYMPTOMS_FILE_PATH)
-        print(f"DEBUG: Conversion completed successfully: {result}")
+        job = jobs.submit('upload_csv', run_upload_job, file_path)
+        print(f"DEBUG: Queued CSV to CLP conversion as job {job.id}")
 
-        return jsonify({
-            'message': f'File uploaded and processed successfully! Generated rules for {result["diseases_count"]} diseases with {result["symptoms_count"]} unique symptoms.',
-            'details': {
-                'diseasesCount': result["diseases_count"],
-                'symptomsCount': result["symptoms_count"],
-                'symptomsSample': result["symptoms"]
-            }
-        }), 200
+        status_url = f"/api/jobs/{job.id}"
+        response = jsonify({
+            'message': 'File uploaded and queued for processing.',
+            'jobId': job.id,
+            'statusUrl': status_url
+        })
+        response.headers['Location'] = status_url
+        return response, 202
     except Exception as e:
         error_trace = traceback.format_exc()
         print(f"ERROR: Exception in upload_csv: {str(e)}")
@@ -313,58 +363,40 @@ def upload_csv():
             'error_detail': error_trace
         }), 500
 
-import re
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'message': f'Job {job_id} not found'}), 404
+    return jsonify(job), 200
 
 
 @app.route('/api/knowledge_base', methods=['GET'])
 def get_knowledge_base():
     """Fetch all diseases and their symptoms from the CLIPS file"""
     try:
-        # Check if file exists
-        if not os.path.exists(CLP_FILE_PATH):
-            print(f"DEBUG: Knowledge base file not found at {CLP_FILE_PATH}")
-            return jsonify([]), 200
-
-        # Read the CLIPS file
-        with open(CLP_FILE_PATH, 'r') as file:
-            content = file.read()
-            print(f"DEBUG: Loaded CLIPS file, size: {len(content)} bytes")
-
-        # Parse the rules to extract diseases and their symptoms
-        knowledge_base = []
-        print("DEBUG: Extracting diseases and symptoms from CLIPS rules")
-
-        # More flexible regex pattern to handle different formatting in the file
-        disease_pattern = r'\(defrule\s+is_it_([A-Za-z0-9_-]+)\s+(.*?)\s*=>'
-        disease_matches = re.finditer(disease_pattern, content, re.DOTALL)
-
-        disease_count = 0
-        for idx, match in enumerate(disease_matches):
-            disease_count += 1
-            disease_id = idx + 1
-            disease_name = match.group(1).replace('_', ' ')
-            symptom_pattern = r'\(has_symptom\s+([A-Za-z0-9_-]+)\)'
-            symptoms = re.findall(symptom_pattern, match.group(2))
-
-            print(f"DEBUG: Found disease #{disease_id}: {disease_name} with {len(symptoms)} symptoms")
-
-            knowledge_base.append({
-                'id': disease_id,
-                'disease': disease_name,
-                'symptoms': symptoms
-            })
-
-        print(f"DEBUG: Total diseases extracted: {disease_count}")
-
-        # Check for potential missed patterns
-        all_rules = re.findall(r'\(defrule\s+is_it_([A-Za-z0-9_-]+)', content)
-        print(f"DEBUG: Total 'is_it_' rules found in file: {len(all_rules)}")
-
-        if len(all_rules) > disease_count:
-            print(
-                f"DEBUG: Warning! Not all diseases were captured. Found {len(all_rules)} rule definitions but only extracted {disease_count}")
-
-        return jsonify(knowledge_base), 200
+        # Optional paging and filtering: ?offset=0&limit=50&prefix=dia
+        try:
+            offset = max(int(request.args.get('offset', 0)), 0)
+            limit = request.args.get('limit')
+            limit = max(int(limit), 0) if limit is not None else None
+        except ValueError:
+            return jsonify({'error': 'offset and limit must be integers'}), 400
+        prefix = request.args.get('prefix')
+
+        # The ETag changes with every knowledge-base version
+        etag = kb_index.refresh()
+        if request.if_none_match.contains_raw(etag):
+            return '', 304, {'ETag': etag}
+
+        total, knowledge_base = kb_index.page(offset, limit, prefix)
+        print(f"DEBUG: Returning {len(knowledge_base)} of {total} diseases")
+
+        response = jsonify(knowledge_base)
+        response.headers['ETag'] = etag
+        response.headers['X-Total-Count'] = str(total)
+        return response, 200
     except Exception as e:
         print(f"ERROR: Failed to fetch knowledge base: {str(e)}")
         print(traceback.format_exc())
@@ -380,53 +412,29 @@ def add_symptom():
         if not symptom:
             return jsonify({'error': 'Symptom cannot be empty'}), 400
 
-        # Get current knowledge base
-        response = app.test_client().get('/api/knowledge_base')
-        knowledge_base = response.get_json()
-
         # Find the disease by ID
-        disease = next((d for d in knowledge_base if d['id'] == disease_id), None)
+        disease = kb_index.get(disease_id)
         if not disease:
             return jsonify({'error': f'Disease with ID {disease_id} not found'}), 404
 
         # Format disease name for the rule pattern
         rule_disease_name = disease['disease'].replace(' ', '_')
 
-        # Read the current file content
-        with open(CLP_FILE_PATH, 'r') as file:
-            content = file.read()
-
-        # Find the complete disease rule with a more robust pattern
-        pattern = rf'\(defrule\s+is_it_{re.escape(rule_disease_name)}([\s\S]*?)=>\s*([\s\S]*?)\)'
-        rule_match = re.search(pattern, content, re.DOTALL)
-
-        if not rule_match:
+        # Add the symptom unless the disease already has it
+        added = store.add_symptoms(rule_disease_name, [symptom])
+        if added is None:
             return jsonify({'error': f'Disease rule for {disease["disease"]} not found'}), 404
-
-        # Check if symptom already exists
-        symptom_pattern = rf'\(has_symptom\s+{re.escape(symptom)}\)'
-        if re.search(symptom_pattern, rule_match.group(0)):
+        if not added:
             return jsonify({'status': 'info', 'message': f'Symptom {symptom} already exists for {disease["disease"]}'}), 200
-
-        # Get the whole rule and parts for reconstruction
-        whole_rule = rule_match.group(0)
-        before_arrow = rule_match.group(1)
-        after_arrow = rule_match.group(2)
-
-        # Create updated rule with new symptom
-        new_rule = f'(defrule is_it_{rule_disease_name}{before_arrow}  (has_symptom {symptom})\n=>{after_arrow})'
-
-        # Replace the old rule with the updated one
-        updated_content = content.replace(whole_rule, new_rule)
-
-        # Write back to file
-        with open(CLP_FILE_PATH, 'w') as file:
-            file.write(updated_content)
+        # Announce the rule under its stored name, which may differ in case from the request's
+        publish_changes([f"is_it_{store.disease(rule_disease_name)[1]}"])
 
         return jsonify({
             'status': 'success',
             'message': f'Added symptom {symptom} to {disease["disease"]}'
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error adding symptom: {str(e)}")
         print(traceback.format_exc())  # Add for better debugging
@@ -439,29 +447,20 @@ def remove_symptom():
         disease_id = data.get('diseaseId')
         symptom = data.get('symptom')
 
-        # Get current knowledge base
-        response = app.test_client().get('/api/knowledge_base')
-        knowledge_base = response.get_json()
-
         # Find the disease by ID
-        disease = next((d for d in knowledge_base if d['id'] == disease_id), None)
+        disease = kb_index.get(disease_id)
         if not disease:
             return jsonify({'error': f'Disease with ID {disease_id} not found'}), 404
 
         # Format disease name for rule matching
         rule_disease_name = disease['disease'].replace(' ', '_')
 
-        # Read the current file content
-        with open(CLP_FILE_PATH, 'r') as file:
-            content = file.read()
-
-        # Pattern to match the symptom line in the specific disease rule
-        symptom_pattern = rf'(\(defrule is_it_{rule_disease_name}\s*[^=]*)(\n\s*\(has_symptom\s+{symptom}\))(.*=>)'
-        content = re.sub(symptom_pattern, r'\1\3', content, flags=re.DOTALL)
-
-        # Write updated content back
-        with open(CLP_FILE_PATH, 'w') as file:
-            file.write(content)
+        # Remove the symptom from the disease
+        removed = store.remove_symptoms(rule_disease_name, [symptom])
+        if removed is None:
+            return jsonify({'error': f'Disease rule for {disease["disease"]} not found'}), 404
+        if removed:
+            publish_changes([f"is_it_{store.disease(rule_disease_name)[1]}"])
 
         return jsonify({'status': 'success', 'message': f'Removed symptom {symptom} from {disease["disease"]}'}), 200
     except Exception as e:
@@ -482,35 +481,121 @@ def add_disease():
         # Format disease name for CLIPS
         rule_disease_name = disease_name.replace(' ', '_')
 
-        # Format symptoms for the rule
-        symptoms_text = "\n  ".join([f"(has_symptom {symptom})" for symptom in symptoms])
+        # Add the disease, replacing its rules if it already exists
+        store.upsert_diseases([(rule_disease_name, symptoms, disease_name)])
+        # An existing disease keeps its stored spelling; announce the rules under that name
+        _, stored_name, _ = store.disease(rule_disease_name)
+        publish_changes([stored_name, f"is_it_{stored_name}"])
+
+        return jsonify({
+            'status': 'success',
+            'message': f'Added new disease: {disease_name} with {len(symptoms)} symptoms'
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error adding disease: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def parse_batch_operation(operation, created):
+    """Turn one /api/kb/batch operation into a store edit; returns (edit, None) or (None, error message)"""
+    if not isinstance(operation, dict):
+        return None, 'Operation must be an object'
+    action = operation.get('op')
+    if action not in ('add', 'remove', 'create'):
+        return None, f'Unknown op {action!r}; expected add, remove or create'
+    symptoms = operation.get('symptoms')
+    if symptoms is None and operation.get('symptom') is not None:
+        symptoms = [operation['symptom']]
+    if not isinstance(symptoms, list) or not all(isinstance(s, str) for s in symptoms):
+        return None, 'symptoms must be a list of strings'
+    symptoms = [s.strip().replace(' ', '') for s in symptoms if s.strip()]
+    try:
+        for symptom in symptoms:
+            check_name(symptom)
+    except ValueError as e:
+        return None, str(e)
 
-        # Create the new disease rule
-        new_rule = f"""
-(defrule {rule_disease_name}
-  (disease_is {rule_disease_name})
-  =>
-  (printout t "{disease_name}" crlf)
-)
+    if action == 'create':
+        disease_name = str(operation.get('name', '')).strip()
+        if not disease_name or not symptoms:
+            return None, 'Disease name and at least one symptom are required'
+        rule_disease_name = disease_name.replace(' ', '_')
+        try:
+            check_name(rule_disease_name)
+        except ValueError as e:
+            return None, str(e)
+        created.add(disease_key(rule_disease_name))
+        return ('create', rule_disease_name, symptoms, disease_name), None
+
+    if not symptoms:
+        return None, 'Symptom cannot be empty'
+
+    # Diseases are named by ID like the single-edit endpoints, or by name
+    if operation.get('diseaseId') is not None:
+        disease = kb_index.get(operation['diseaseId'])
+        if not disease:
+            return None, f'Disease with ID {operation["diseaseId"]} not found'
+        rule_disease_name = disease['disease'].replace(' ', '_')
+    else:
+        rule_disease_name = str(operation.get('disease', '')).strip().replace(' ', '_')
+        if not rule_disease_name:
+            return None, 'diseaseId or disease is required'
+        if disease_key(rule_disease_name) not in created and store.disease(rule_disease_name) is None:
+            return None, f'Disease {operation["disease"]} not found'
+    return (action, rule_disease_name, symptoms), None
+
+
+@app.route('/api/kb/batch', methods=['POST'])
+def apply_batch():
+    """Apply many add/remove/create edits at once: one transaction, one rule rewrite, one version bump"""
+    try:
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'operations must be a non-empty list'}), 400
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return jsonify({'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}), 400
+
+        # Validate everything before touching the store, and report every problem at once
+        edits, errors, created = [], [], set()
+        for index, operation in enumerate(operations):
+            edit, error = parse_batch_operation(operation, created)
+            if error:
+                errors.append({'index': index, 'error': error})
+            else:
+                edits.append(edit)
+        if errors:
+            return jsonify({'error': 'Batch rejected; nothing was applied', 'errors': errors}), 400
 
-(defrule is_it_{rule_disease_name}
-  {symptoms_text}
-  =>
-  (assert (disease_is {rule_disease_name}))
-)
-"""
+        try:
+            changed = store.apply_edits(edits)
+        except KeyError as e:
+            # Deleted by someone else since validation; the transaction was rolled back
+            return jsonify({'error': f'Disease {e.args[0]} not found; nothing was applied'}), 409
 
-        # Append the new rule to the file
-        with open(CLP_FILE_PATH, 'a') as file:
-            file.write(new_rule)
+        version = publish_changes(sorted(changed)) if changed else None
+        print(f"DEBUG: Applied batch of {len(edits)} operations, {len(changed)} rules changed")
 
         return jsonify({
             'status': 'success',
-            'message': f'Added new disease: {disease_name} with {len(symptoms)} symptoms'
+            'message': f'Applied {len(edits)} operations',
+            'applied': len(edits),
+            'changedRules': sorted(changed),
+            'version': version
         }), 200
     except Exception as e:
-        print(f"Error adding disease: {str(e)}")
+        print(f"Error applying batch: {str(e)}")
+        print(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Serve the latency histograms in the Prometheus text format"""
+    return render(REQUEST_SECONDS, PUBLISH_SECONDS), 200, {'Content-Type': CONTENT_TYPE}
+
+
 if __name__ == '__main__':
     print("\n" + "="*80)
     print("DEBUG: Starting Flask server on port 5001")
@@ -1,6 +1,11 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import re
+import os
+import sys
+
+# Shared modules live in the project root, one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clp_parser import iter_rules
 
 app = Flask(__name__)
 CORS(app)
@@ -10,22 +15,20 @@ RULES_FILE_PATH = 'data/disease-symptoms.clp'
 SYMPTOMS_FILE_PATH = 'data/symptoms.txt'
 
 def load_rules(file_path):
-    """Load the rules from the given file path."""
+    """Stream the rules from the given file path."""
     try:
-        with open(file_path, 'r') as file:
-            return file.read()
+        return list(iter_rules(file_path))
     except FileNotFoundError:
         print(f"Rules file not found at path: {file_path}")
-        return ""
+        return []
 
-def parse_rules(rules_text):
-    """Parse the rules text to extract symptoms and diseases."""
-    rules = re.findall(r'\(defrule is_it_(\w+)(.*?)=>', rules_text, re.DOTALL)
+def parse_rules(rules):
+    """Parse the rule records to extract symptoms and diseases."""
     disease_symptoms = {}
 
-    for disease, rule in rules:
-        symptoms = re.findall(r'\(has_symptom (\w+)\)', rule)
-        disease_symptoms[disease] = set(symptoms)
+    for rule in rules:
+        if rule.disease is not None:
+            disease_symptoms[rule.disease] = set(rule.symptoms)
 
     return disease_symptoms
 
@@ -52,8 +55,8 @@ def filter_symptoms(diseases, disease_symptoms, selected_symptoms):
     return sorted(available_symptoms)
 
 # Load rules at startup
-rules_text = load_rules(RULES_FILE_PATH)
-disease_symptoms = parse_rules(rules_text)
+rules = load_rules(RULES_FILE_PATH)
+disease_symptoms = parse_rules(rules)
 
 
 @app.route('/api/get_initial_symptoms', methods=['GET'])
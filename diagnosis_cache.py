@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DiagnosisCache:
+    """Bounded LRU cache of /diagnose results with an optional time-to-live.
+
+    Keys pair the knowledge-base version with the sorted, de-duplicated
+    symptom names, so the same symptoms in any order share one entry and
+    every rule edit makes older entries unreachable.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(symptoms, version):
+        return version, tuple(sorted(set(symptoms)))
+
+    def get(self, key):
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            if not self._is_current(key[0]):
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if not self._is_current(key[0]):
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _is_current(self, version):
+        # Entries from an older knowledge base can never be hit again, and a
+        # request that started before an edit must not repopulate the cache.
+        if self._version is None or version > self._version:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._version = version
+        return version == self._version
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
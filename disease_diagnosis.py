@@ -1,59 +1,352 @@
+import collections
+import itertools
 import os
+import sys
+import threading
+import time
 import logging
-from clips import Environment
+from clips import Environment, CLIPSError, Router, Symbol
+from clips._clips import ffi, lib
+
+import knowledge_store
+from kb_image import binary_image_path, image_is_current, refresh_binary_image
+from knowledge_store import open_store
+
+# Rules fired per env.run call when a run has a budget; the budget is checked between slices.
+RUN_SLICE = 100
+# Pending activations looked at to name the rules behind a cut-short run.
+OVERRUN_SAMPLE = 10
+
+
+class NullRouter(Router):
+    """Swallows everything CLIPS prints to t/stdout; warnings and errors still get through."""
+
+    def __init__(self):
+        super().__init__('null-stdout', 30)
+
+    def query(self, name):
+        return name in ('t', 'stdout')
+
+    def write(self, name, message):
+        pass
+
+
+class RuleStats:
+    """Activation and firing counts per rule, shared by the engines of a pool."""
 
-class DiseaseDiagnosis:
     def __init__(self):
+        self._lock = threading.Lock()
+        self.activations = collections.Counter()
+        self.firings = collections.Counter()
+        # Diagnoses counted since the last clear.
+        self.runs = 0
+
+    def record(self, activations=(), firings=()):
+        with self._lock:
+            self.activations.update(activations)
+            self.firings.update(firings)
+            self.runs += 1
+
+    def snapshot(self, top=None):
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'activations': dict(self.activations.most_common(top)),
+                'firings': dict(self.firings.most_common(top)),
+            }
+
+    def clear(self):
+        with self._lock:
+            self.activations.clear()
+            self.firings.clear()
+            self.runs = 0
+
+
+class TraceRouter(Router):
+    """Counts the activations and firings CLIPS reports under (watch activations) and (watch rules).
+
+    The trace is written to stdout in fragments, so lines are put back
+    together before they are parsed. Anything else the rules print is
+    passed on to sys.stdout, or dropped in lean mode.
+    """
+
+    def __init__(self):
+        super().__init__('rule-trace', 40)
+        self._line = []
+        self.activations = []
+        self.firings = []
+
+    def query(self, name):
+        return name in ('t', 'stdout')
+
+    def write(self, name, message):
+        self._line.append(message)
+        if not message.endswith('\n'):
+            return
+        line = ''.join(self._line)
+        self._line = []
+        # ==> Activation 0      is_it_X: f-1,f-2
+        # FIRE    1 is_it_X: f-1,f-2
+        if line.startswith('==> Activation '):
+            self.activations.append(line.split(None, 4)[3].rstrip(':'))
+        elif line.startswith('FIRE '):
+            self.firings.append(line.split(None, 3)[2].rstrip(':'))
+        elif not line.startswith('<== Activation ') and knowledge_store.PRINTOUT_RULES:
+            sys.stdout.write(line)
+
+    def drain(self):
+        """Return and forget the rules activated and fired since the last drain."""
+        activations, firings = self.activations, self.firings
+        self.activations, self.firings = [], []
+        return activations, firings
+
+
+def new_environment():
+    """A CLIPS environment; in lean mode (CLP_PRINTOUT_RULES=0) its printouts go nowhere."""
+    env = Environment()
+    if not knowledge_store.PRINTOUT_RULES:
+        env.add_router(NullRouter())
+    return env
+
+
+# clipspy 1.0.6 (pinned in requirements.txt) releases a Fact object's fact
+# with ReleaseFact(env, fact), but the CLIPS it bundles declares
+# ReleaseFact(fact); Fact.__del__ swallows the TypeError. Every fact ever
+# wrapped in Python then stays allocated after it is retracted, and each
+# reset and assert gets a little slower than the last.
+FACT_OBJECTS_LEAK = len(ffi.typeof(lib.ReleaseFact).args) == 1
+
+
+def release(facts):
+    """Let go of Fact objects that are no longer needed, where the bindings won't."""
+    if FACT_OBJECTS_LEAK:
+        for fact in facts:
+            lib.ReleaseFact(fact._fact)
+
+
+def slot_values(template, slot='name'):
+    """The slot of every fact of template, releasing the Fact objects read along the way."""
+    facts = list(template.facts())
+    values = [fact[slot] for fact in facts]
+    release(facts)
+    return values
+
+
+def run_bounded(env, limit=None, deadline=None):
+    """Fire env's agenda in slices until it is empty, limit rules have fired or deadline (time.monotonic()) passes.
+
+    Returns (fired, reason, rules): reason is None when the agenda was
+    emptied, otherwise 'limit' or 'deadline', and rules then names the
+    rules of the activations still waiting.
+    """
+    if limit is None and deadline is None:
+        return env.run(), None, []
+    fired = 0
+    while True:
+        step = RUN_SLICE if limit is None else min(RUN_SLICE, limit - fired)
+        count = env.run(step) if step > 0 else 0
+        fired += count
+        if count < step:
+            return fired, None, []
+        # The slice may have emptied the agenda exactly.
+        pending = list(dict.fromkeys(
+            activation.name for activation in itertools.islice(env.activations(), OVERRUN_SAMPLE)))
+        if not pending:
+            return fired, None, []
+        if limit is not None and fired >= limit:
+            return fired, 'limit', pending
+        if deadline is not None and time.monotonic() >= deadline:
+            return fired, 'deadline', pending
+
+
+def rule_matches(env, top=20):
+    """The top rules of env by partial matches held, with their pattern matches and pending activations."""
+    rows = []
+    for rule in env.rules():
+        matches, partial, activations = rule.matches()
+        rows.append({'rule': rule.name, 'matches': matches,
+                     'partial_matches': partial, 'activations': activations})
+    rows.sort(key=lambda row: (-row['partial_matches'], -row['matches'], row['rule']))
+    return rows[:top]
+
+
+class DiseaseDiagnosis:
+    backend = 'clips'
+    # The pool bsaves the rules once so the other engines can bload them.
+    uses_binary_image = True
+
+    def __init__(self, session_facts=False, run_limit=None, run_timeout=None, binary_image=True):
+        # Between diagnoses, retract only the facts the last one asserted and
+        # derived instead of resetting the whole environment.
+        self.session_facts = session_facts
+        # Budget of every run(): rules fired and seconds; None is unbounded.
+        self.run_limit = run_limit
+        self.run_timeout = run_timeout
+        # Rules left on the agenda when the last run was cut short.
+        self.overrun_rules = []
+        # Count rule activations and firings into rule_stats; checked at the start of every diagnosis.
+        self.sampling = False
+        self.rule_stats = RuleStats()
+        # CLIPS (mem-used) in bytes after the last run, recorded while sampling.
+        self.memory_after_run = None
+        # bload the rules when the image is current. CLIPS can't build rules
+        # into a bload image, so an engine meant to take edits loads the text.
+        self.binary_image = binary_image
         self.dataPath = os.path.abspath(os.path.join(os.getcwd(), 'data'))
         self.diseasePath = os.path.join(self.dataPath, 'disease-symptoms.clp')
-        self.env = Environment()
+        self.store = open_store(self.dataPath)
         self.load_environment()
         super().__init__()
         self.matched_diseases = set()
 
     def load_environment(self):
-        self.env.clear()
-        self.env.load(self.diseasePath)
-        logging.info("CLIPS environment loaded with rules from disease-symptoms.clp")
+        # Load into a fresh environment and swap it in by reference, so the
+        # old one is never seen half-cleared; it is freed once unreferenced.
+        self.store.sync_files(self.dataPath)
+        env = new_environment()
+        if self.binary_image and image_is_current(self.diseasePath):
+            env.load(binary_image_path(self.diseasePath), binary=True)
+            binary_loaded = True
+            logging.info("CLIPS environment loaded from binary image of disease-symptoms.clp")
+        else:
+            env.load(self.diseasePath)
+            binary_loaded = False
+            logging.info("CLIPS environment loaded with rules from disease-symptoms.clp")
+        self.env = env
+        self._has_symptom = env.find_template('has_symptom')
+        self._disease_is = env.find_template('disease_is')
+        # False until a new environment has had its first full reset, and again after a cut-short run.
+        self._session = False
+        self.binary_loaded = binary_loaded
+        self.loaded_at = time.monotonic()
+        self.memory_loaded = env.eval('(mem-used)')
+        self._tracer = None
+        self._tracing = False
+
+    def build_rules(self, rules):
+        """Define or redefine individual rules without reparsing the whole file."""
+        if not rules:
+            return
+        if self.binary_loaded:
+            # CLIPS refuses new constructs while a bload image is in effect.
+            self.load_environment()
+            return
+        try:
+            for rule in rules:
+                self.env.build(rule)
+        except CLIPSError as e:
+            logging.warning(f"Incremental rule build failed, reloading all rules: {e}")
+            self.load_environment()
+            return
+        # A new rule may be one that only a full reset activates; check again after the next one.
+        self._session = False
 
     def reset(self):
+        self._trace()
+        if self.session_facts and self._session:
+            self._retract_session()
+            return
         self.env.reset()
+        # A rule the reset alone activates, such as one with no patterns (a
+        # disease whose symptoms were all removed), fires again only after
+        # another reset, so with one in the rules every diagnosis resets.
+        self._session = self.session_facts and next(iter(self.env.activations()), None) is None
         logging.info("CLIPS environment reset.")
 
+    def _retract_session(self):
+        # Every disease_is fact was derived from this session's symptoms, and
+        # every has_symptom fact was given or derived in it. Rules that assert
+        # any other kind of fact need the full reset instead.
+        facts = list(self._disease_is.facts()) + list(self._has_symptom.facts())
+        try:
+            for fact in facts:
+                fact.retract()
+        except CLIPSError as e:
+            logging.warning(f"Retracting session facts failed, resetting the environment: {e}")
+            self.env.reset()
+        finally:
+            release(facts)
+
     def addSymptom(self, symptom):
-        text = f'(assert (has_symptom {symptom}))'
-        self.env.eval(text)
+        self.addSymptoms([symptom])
+
+    def addSymptoms(self, symptoms):
+        assert_fact = self._has_symptom.assert_fact
+        release([assert_fact(name=Symbol(symptom)) for symptom in symptoms])
+
+    def run(self, limit=None, timeout=None):
+        """Fire the rules within a budget, by default the engine's run_limit and run_timeout.
+
+        Returns None if the agenda ran empty, or 'limit' or 'deadline' if
+        the run was cut short; getDiseases then has what was found so far
+        and overrun_rules names the rules that were still waiting.
+        """
+        limit = self.run_limit if limit is None else limit
+        timeout = self.run_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        _, reason, self.overrun_rules = run_bounded(self.env, limit, deadline)
+        self._record_trace()
+        if reason is not None:
+            # The cut-short rules may have asserted anything; clear it with a full reset.
+            self._session = False
+        return reason
+
+    def _trace(self):
+        # Turn the environment's trace on or off to match self.sampling, at
+        # the start of a diagnosis. Rules built later inherit the watch
+        # state; a reloaded environment starts untraced.
+        if self.env is None or self.sampling == self._tracing:
+            return
+        if self.sampling:
+            if self._tracer is None:
+                self._tracer = TraceRouter()
+                self.env.add_router(self._tracer)
+            self._tracer.drain()
+            self._tracer.activate()
+            self.env.eval('(watch activations)')
+            self.env.eval('(watch rules)')
+        else:
+            self.env.eval('(unwatch activations)')
+            self.env.eval('(unwatch rules)')
+            self._tracer.deactivate()
+        self._tracing = self.sampling
+
+    def _record_trace(self, activations=(), firings=()):
+        # Called at the end of a run with any rules matched outside CLIPS.
+        if self._tracing:
+            traced_activations, traced_firings = self._tracer.drain()
+            activations = list(activations) + traced_activations
+            firings = list(firings) + traced_firings
+            self.memory_after_run = self.env.eval('(mem-used)')
+        elif not self.sampling:
+            return
+        self.rule_stats.record(activations, firings)
+
+    def introspect(self, top=20):
+        """Rule and fact counts, memory and the rules holding the most partial matches.
 
-    def run(self):
-        _ = self.env.run()
+        Walks every rule, so call it on an engine that is checked out.
+        """
+        return {
+            'rules': sum(1 for _ in self.env.rules()),
+            'facts': self.env.eval('(length$ (get-fact-list *))'),
+            'memory': {
+                'loaded': self.memory_loaded,
+                'after_run': self.memory_after_run,
+                'current': self.env.eval('(mem-used)'),
+            },
+            'partial_matches': rule_matches(self.env, top),
+        }
 
     def getDiseases(self):
-        diseases = []
-        for fact in self.env.facts():
-            fact = str(fact)
-            if "disease_is" in fact:
-                disease = fact[1:-1].split(" ")[1]
-                disease = disease.replace("_", " ")
-                disease = disease.title()
-                diseases.append(disease)
-        return diseases
+        # Only the disease_is facts are visited, however many symptoms were asserted.
+        return [name.replace("_", " ").title() for name in slot_values(self._disease_is)]
 
     def getSymptoms(self):
-        symptoms = []
-        for fact in self.env.facts():
-            fact = str(fact)
-            if "has_symptom" in fact:
-                symptom = fact[1:-1].split(" ")[1]
-                symptom = symptom.replace("_", " ")
-                symptom = symptom.title()
-                symptoms.append(symptom)
-        return symptoms
+        return [name.replace("_", " ").title() for name in slot_values(self._has_symptom)]
 
     def getSymptomList(self):
-        path = os.path.join(self.dataPath, 'symptoms.txt')
-        with open(path, "r") as f:
-            symptoms = [x.strip().replace('_', ' ').title() for x in f if x.strip()]
-        return symptoms
+        return [x.replace('_', ' ').title() for x in self.store.symptom_names()]
 
     def get_known_symptoms(self):
         # This method returns a list of known symptoms
@@ -61,31 +354,15 @@ class DiseaseDiagnosis:
         return self.getSymptomList()
 
     def add_new_symptom(self, rule_name, symptom):
-        path = os.path.join(self.dataPath, 'symptoms.txt')
-        diseasePath = os.path.join(self.dataPath, 'disease-symptoms.clp')
+        """Add symptom to a disease's rule; returns the rules rebuilt, [] if it already had it, None if there is no such disease."""
+        disease = rule_name[len('is_it_'):] if rule_name.startswith('is_it_') else rule_name
+        added = self.store.add_symptoms(disease, [symptom])
+        if not added:
+            return added
+        if self.store.sync_files(self.dataPath):
+            refresh_binary_image(self.diseasePath)
 
-        with open(path, "r") as f:
-            symptoms = [line.strip() for line in f]
-
-        if symptom not in symptoms:
-            with open(path, "a") as f:
-                f.write(f"{symptom}\n")
-
-        with open(diseasePath, "r") as f:
-            lines = f.readlines()
-
-        found_disease = False
-        new_lines = []
-        for line in lines:
-            new_line = line
-            if rule_name.lower() in line.lower():
-                found_disease = True
-            if "=>" in line and found_disease:
-                new_line = line.replace("=>", f"(has_symptom {symptom})\n\t=>")
-                found_disease = False
-            new_lines.append(new_line)
-
-        with open(diseasePath, "w") as f:
-            f.writelines(new_lines)
-
-        self.load_environment()
+        _, name, _ = self.store.disease(disease)
+        rules = [rule.to_source() for rule in self.store.rules([f"is_it_{name}"])]
+        self.build_rules(rules)
+        return rules
@@ -0,0 +1,364 @@
+import collections
+import logging
+import math
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from disease_diagnosis import DiseaseDiagnosis, RuleStats
+from kb_image import image_is_current, write_binary_image
+
+
+# Recent checkouts kept for the wait percentiles and the Retry-After estimate.
+WAIT_SAMPLES = 1000
+
+
+class EnginePoolExhausted(RuntimeError):
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        # Whole seconds a client should wait before trying again.
+        self.retry_after = retry_after
+
+
+class EnginePool:
+    """A fixed set of preloaded DiseaseDiagnosis engines.
+
+    Each request checks an engine out, has it to itself for the duration
+    of reset/addSymptoms/run/getDiseases, and hands it back afterwards, so
+    concurrent requests never share a fact base.
+
+    Full reloads never touch an engine that is serving a request. A
+    background thread loads a complete new set of engines and swaps it in
+    as the pool's next epoch; engines from the old epoch finish whatever
+    request they are on and are dropped when they come back.
+    """
+
+    def __init__(self, size=4, timeout=5.0, log_exhaustion=True, full_reload_interval=3600.0,
+                 engine_factory=DiseaseDiagnosis, engine_options=None, max_waiting=None, sampling=False):
+        self.size = size
+        # Requests allowed to queue for an engine; the next one is turned away at once.
+        self.max_waiting = max_waiting
+        self.engine_factory = engine_factory
+        # Keyword arguments for every engine the pool creates.
+        self.engine_options = engine_options or {}
+        self.timeout = timeout
+        self.log_exhaustion = log_exhaustion
+        self.full_reload_interval = full_reload_interval
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self.generation = 0
+        # (generation, rules) pairs not yet built into every engine.
+        self._updates = []
+        self._epoch = 0
+        self._reload_thread = None
+        self._reload_pending = False
+        # Generation the running reload's engines are loaded at; None when idle.
+        self._reload_generation = None
+        self._checkouts = 0
+        self._waits = 0
+        self._exhausted = 0
+        self._in_use = 0
+        self._reloads = 0
+        self._waiting = 0
+        self._max_waiting_seen = 0
+        self._rejected = 0
+        # Seconds spent waiting for, and holding, an engine over the last WAIT_SAMPLES checkouts.
+        self._wait_times = collections.deque(maxlen=WAIT_SAMPLES)
+        self._hold_times = collections.deque(maxlen=WAIT_SAMPLES)
+        # Rule name -> runs cut short by the firing limit or deadline while it was on the agenda.
+        self._overruns = collections.Counter()
+        # Per-rule activation and firing counts from every engine, kept across reloads.
+        self.sampling = sampling
+        self.rule_stats = RuleStats()
+
+        self._engines = self._load_engines(self.generation, self._epoch, binary_image=True)
+        self._epoch_loaded_at = time.monotonic()
+        for engine in self._engines:
+            self._idle.put(engine)
+
+        # Any engine can answer questions about the data files.
+        self._reference = self._engines[0]
+        self.dataPath = self._reference.dataPath
+        self.diseasePath = self._reference.diseasePath
+        self.store = self._reference.store
+        logging.info(f"Engine pool started with {size} {engine_factory.backend} engines")
+        if any(engine.binary_loaded for engine in self._engines):
+            # bload gets the pool serving quickly, but a bloaded engine can
+            # only take a rule edit by reparsing the whole file. Swap in
+            # text-loaded engines before the first edit needs them.
+            self.reload()
+
+    def _load_engines(self, generation, epoch, binary_image=False):
+        options = dict(self.engine_options, binary_image=binary_image)
+        # Parse the text rules once so every engine after the first can bload.
+        first = self.engine_factory(**options)
+        if binary_image and first.uses_binary_image and not image_is_current(first.diseasePath):
+            try:
+                write_binary_image(first.diseasePath)
+            except Exception as e:
+                logging.warning(f"Could not write binary knowledge-base image: {e}")
+        engines = [first] + [self.engine_factory(**options) for _ in range(self.size - 1)]
+        for engine in engines:
+            engine.generation = generation
+            engine.epoch = epoch
+            engine.rule_stats = self.rule_stats
+            engine.sampling = self.sampling
+        return engines
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        engine = self._acquire(self.timeout if timeout is None else timeout)
+        start = time.monotonic()
+        try:
+            yield engine
+        finally:
+            self._release(engine, time.monotonic() - start)
+
+    def _acquire(self, timeout, reparse=False):
+        start = time.monotonic()
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self.max_waiting is not None and self._waiting >= self.max_waiting:
+                    self._rejected += 1
+                    raise EnginePoolExhausted(f"Diagnosis queue is full ({self._waiting} waiting)",
+                                              self._retry_after())
+                self._waits += 1
+                self._waiting += 1
+                self._max_waiting_seen = max(self._max_waiting_seen, self._waiting)
+            try:
+                engine = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._exhausted += 1
+                    retry_after = self._retry_after()
+                if self.log_exhaustion:
+                    logging.warning(f"Engine pool exhausted: no engine free after {timeout}s")
+                raise EnginePoolExhausted(f"No diagnosis engine available after {timeout}s", retry_after)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        with self._lock:
+            self._wait_times.append(time.monotonic() - start)
+            self._checkouts += 1
+            self._in_use += 1
+            generation = self.generation
+            updates = [rules for update_generation, rules in self._updates if update_generation > engine.generation]
+            overdue = time.monotonic() - self._epoch_loaded_at > self.full_reload_interval
+
+        if overdue:
+            # Periodic full reload doubles as a consistency check against the file.
+            self.reload()
+        if updates and engine.binary_loaded and not reparse:
+            # Rather than reparse the rule file on this request's thread,
+            # hand the engine back and take a text-loaded one from the reload.
+            swapped = self._await_reload(engine, timeout - (time.monotonic() - start))
+            return self._acquire(max(0, timeout - (time.monotonic() - start)), reparse=not swapped)
+        try:
+            for rules in updates:
+                engine.build_rules(rules)
+        except Exception:
+            # A rule that won't build (or a reload that then fails) must not
+            # cost the pool this engine. It goes back with its generation
+            # unchanged, so its next checkout tries the updates again.
+            with self._lock:
+                self._in_use -= 1
+                if engine.epoch == self._epoch:
+                    self._idle.put(engine)
+            raise
+        engine.generation = generation
+        return engine
+
+    def _await_reload(self, engine, timeout):
+        # Return an engine unused and wait for the next swap. False if the
+        # reload failed and the current engines are all there is.
+        with self._lock:
+            self._checkouts -= 1
+            self._in_use -= 1
+            if engine.epoch == self._epoch:
+                self._idle.put(engine)
+            epoch = self._epoch
+            thread = self._reload_thread
+        if thread is None:
+            thread = self.reload()
+        thread.join(max(0, timeout))
+        if thread.is_alive():
+            with self._lock:
+                self._exhausted += 1
+                retry_after = self._retry_after()
+            raise EnginePoolExhausted(f"Diagnosis engines still reloading after {timeout:.1f}s", retry_after)
+        with self._lock:
+            return self._epoch != epoch
+
+    def _retry_after(self):
+        # Time for the engines to work through the queue at the recent pace. Called with the lock held.
+        if not self._hold_times:
+            return 1
+        hold = sum(self._hold_times) / len(self._hold_times)
+        return max(1, math.ceil((self._waiting + 1) * hold / self.size))
+
+    def _release(self, engine, held):
+        with self._lock:
+            self._hold_times.append(held)
+            self._in_use -= 1
+            if engine.epoch != self._epoch:
+                # Replaced by a reload while it was checked out; let it be freed.
+                return
+            # Updates stay until every engine has them, and until the reload
+            # in flight, whose engines start from its snapshot, has swapped in.
+            oldest = min(e.generation for e in self._engines)
+            if self._reload_generation is not None:
+                oldest = min(oldest, self._reload_generation)
+            self._updates = [update for update in self._updates if update[0] > oldest]
+            # Put back under the lock, so a swap can't slip in between and
+            # leave an old-epoch engine in the new idle queue.
+            self._idle.put(engine)
+
+    def apply_rules(self, rules):
+        """Queue rule definitions to be built into every engine on its next checkout."""
+        if not rules:
+            return
+        with self._lock:
+            self.generation += 1
+            self._updates.append((self.generation, list(rules)))
+
+    def refresh_rules(self, names):
+        """Pick up rules another process changed in the knowledge store.
+
+        Rules are rebuilt one by one; a rule that has disappeared from the
+        store can't be built away, so that case falls back to a full reload.
+        Printout rules are missing by design in lean mode, so only missing
+        is_it_ rules count.
+
+        A full reload is waited for: the caller moves the cache on to the
+        new version when this returns, and until the swap the old engines
+        would answer, and fill the cache, with the old rules.
+        """
+        if names is None:
+            return self.reload(wait=True)
+        records = list(self.store.rules(names))
+        found = {rule.name for rule in records}
+        if any(name.startswith('is_it_') and name not in found for name in names):
+            return self.reload(wait=True)
+        rules = [rule.to_source() for rule in records]
+        self.apply_rules(rules)
+
+    def reload(self, wait=False):
+        """Reload every engine from the rule file in the background and swap the new set in.
+
+        Requests keep being served by the current engines until the swap.
+        A reload asked for while one is running is folded into one more
+        pass once the running one finishes, so the last edit is never lost.
+        """
+        with self._lock:
+            if self._reload_thread is not None:
+                self._reload_pending = True
+                thread = self._reload_thread
+            else:
+                thread = self._reload_thread = threading.Thread(target=self._reload_loop, daemon=True)
+                thread.start()
+        if wait:
+            thread.join()
+        return thread
+
+    def _reload_loop(self):
+        while True:
+            with self._lock:
+                self._reload_pending = False
+                generation = self._reload_generation = self.generation
+                epoch = self._epoch + 1
+                # Hold off the periodic check while this pass is loading.
+                self._epoch_loaded_at = time.monotonic()
+            try:
+                # Loaded from text: a reload is off the request path, and
+                # text-loaded engines take rule edits one rule at a time.
+                engines = self._load_engines(generation, epoch)
+            except Exception as e:
+                logging.error(f"Engine pool reload failed, keeping current engines: {e}")
+                engines = None
+
+            with self._lock:
+                if engines is not None:
+                    self._swap(engines, epoch)
+                if not self._reload_pending:
+                    self._reload_thread = None
+                    self._reload_generation = None
+                    return
+
+    def _swap(self, engines, epoch):
+        # Called with the lock held.
+        self._epoch = epoch
+        self._engines = engines
+        self._epoch_loaded_at = time.monotonic()
+        self._reference = engines[0]
+        self._reloads += 1
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for engine in engines:
+            self._idle.put(engine)
+        logging.info(f"Engine pool swapped in {len(engines)} reloaded {self.engine_factory.backend} engines")
+
+    def getSymptomList(self):
+        return self._reference.getSymptomList()
+
+    def set_sampling(self, enabled):
+        """Start or stop counting rule activations and firings; each engine follows from its next diagnosis."""
+        with self._lock:
+            self.sampling = enabled
+            for engine in self._engines:
+                engine.sampling = enabled
+
+    def introspect(self, top=20):
+        """Rule counters from every engine, plus the internals of one idle engine and each engine's memory."""
+        with self.checkout() as engine:
+            report = engine.introspect(top)
+        with self._lock:
+            engines = list(self._engines)
+        report['engine_memory'] = [{'loaded': e.memory_loaded, 'after_run': e.memory_after_run} for e in engines]
+        report['sampling'] = self.sampling
+        report['counters'] = self.rule_stats.snapshot(top)
+        return report
+
+    def record_overrun(self, rules):
+        with self._lock:
+            self._overruns.update(rules)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.engine_factory.backend,
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'exhausted': self._exhausted,
+                'generation': self.generation,
+                'pending_updates': len(self._updates),
+                'reloads': self._reloads,
+                'reloading': self._reload_thread is not None,
+                'overruns': dict(self._overruns),
+                'waiting': self._waiting,
+                'max_waiting': self._max_waiting_seen,
+                'rejected': self._rejected,
+                'wait_ms': _percentiles(self._wait_times),
+            }
+
+
+def _percentiles(samples):
+    if not samples:
+        return {'p50': 0, 'p90': 0, 'p99': 0, 'max': 0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        'p50': round(ordered[last * 50 // 100] * 1000, 3),
+        'p90': round(ordered[last * 90 // 100] * 1000, 3),
+        'p99': round(ordered[last * 99 // 100] * 1000, 3),
+        'max': round(ordered[last] * 1000, 3),
+    }
@@ -0,0 +1,192 @@
+"""Buffered user feedback about symptoms a diagnosis missed.
+
+Reports are appended to data/feedback.log as they arrive and never touch
+the rules directly. A background thread folds the log into per (disease,
+symptom) counts in data/feedback.db, and once a pair has been reported
+threshold times it is added to the rule together with every other pair
+that reached the threshold since the last pass. However much feedback
+comes in, the rules are rewritten at most once per interval.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from knowledge_store import NAME_PATTERN, disease_key, thread_connection
+
+LOG_FILE_NAME = 'feedback.log'
+DB_FILE_NAME = 'feedback.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS support (
+    disease_key TEXT NOT NULL,
+    symptom TEXT NOT NULL,
+    disease TEXT NOT NULL,
+    reports INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (disease_key, symptom)
+) WITHOUT ROWID;
+"""
+
+
+class FeedbackAggregator:
+    """Append feedback to a log and apply well-supported symptoms in periodic batches.
+
+    on_apply(rules) is called from the aggregator thread with the names
+    of the rules a pass changed, so the caller can publish them.
+    """
+
+    def __init__(self, store, data_path, on_apply, threshold=3, interval=60.0):
+        self.store = store
+        self.log_path = os.path.join(data_path, LOG_FILE_NAME)
+        self.db_path = os.path.join(data_path, DB_FILE_NAME)
+        self.on_apply = on_apply
+        self.threshold = threshold
+        self.interval = interval
+        self.applied = 0
+        self._local = threading.local()
+        self._log_lock = threading.Lock()
+        self._pass_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(data_path, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        return thread_connection(self._local, self.db_path)
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def record(self, disease, symptoms, satisfied=False):
+        """Append one report to the log; cheap enough to call on every request."""
+        line = json.dumps({'time': time.time(), 'disease': disease, 'symptoms': symptoms,
+                           'satisfied': bool(satisfied)})
+        with self._log_lock:
+            with open(self.log_path, 'a') as f:
+                f.write(line + '\n')
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Feedback aggregation failed: {e}")
+
+    def run_once(self):
+        """Fold new log lines into the counts, then apply pairs at the threshold; returns the changed rules."""
+        with self._pass_lock:
+            self._fold_log()
+            return self._apply_supported()
+
+    def _fold_log(self):
+        db = self._connection()
+        with self._log_lock:
+            offset = db.execute("SELECT value FROM meta WHERE key = 'offset'").fetchone()
+            offset = offset[0] if offset else 0
+            try:
+                with open(self.log_path, 'rb') as f:
+                    if offset > os.fstat(f.fileno()).st_size:
+                        offset = 0  # truncated after a pass that didn't record it
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            # A line still being written waits for the next pass.
+            data = data[:data.rfind(b'\n') + 1]
+            end = offset + len(data)
+
+            counts = {}
+            for raw in data.splitlines():
+                try:
+                    report = json.loads(raw)
+                except ValueError:
+                    logging.warning(f"Skipping unreadable feedback line: {raw[:200]!r}")
+                    continue
+                if report.get('satisfied'):
+                    continue
+                for symptom in set(report.get('symptoms') or ()):
+                    key = (disease_key(report['disease']), symptom)
+                    entry = counts.setdefault(key, [report['disease'], 0, report['time'], report['time']])
+                    entry[1] += 1
+                    entry[2] = min(entry[2], report['time'])
+                    entry[3] = max(entry[3], report['time'])
+
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.executemany(
+                    'INSERT INTO support (disease_key, symptom, disease, reports, first_seen, last_seen) '
+                    'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (disease_key, symptom) DO UPDATE SET '
+                    'reports = reports + excluded.reports, last_seen = MAX(last_seen, excluded.last_seen)',
+                    [key + tuple(entry) for key, entry in counts.items()])
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('offset', ?)", (end,))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+
+            # Everything in the log is counted now, so start it over.
+            if os.path.getsize(self.log_path) == end:
+                open(self.log_path, 'w').close()
+                db.execute("UPDATE meta SET value = 0 WHERE key = 'offset'")
+
+    def _apply_supported(self):
+        db = self._connection()
+        rows = db.execute('SELECT disease_key, symptom, disease FROM support WHERE reports >= ?',
+                          (self.threshold,)).fetchall()
+        if not rows:
+            return set()
+
+        edits = {}
+        for key, symptom, disease in rows:
+            # Reports logged before names were checked can't become rules; they are dropped below.
+            if not NAME_PATTERN.match(symptom):
+                continue
+            if key in edits or self.store.disease(disease) is not None:
+                edits.setdefault(key, ('add', disease, []))[2].append(symptom)
+        try:
+            changed = self.store.apply_edits(list(edits.values()))
+        except KeyError:
+            # A disease was removed between the check and the write; try again next pass.
+            return set()
+
+        # Pairs for diseases that no longer exist are dropped along with the applied ones.
+        db.executemany('DELETE FROM support WHERE disease_key = ? AND symptom = ?',
+                       [(key, symptom) for key, symptom, _ in rows])
+        self.applied += sum(len(edit[2]) for edit in edits.values())
+        if changed:
+            logging.info(f"Feedback added symptoms to {len(edits)} diseases")
+            self.on_apply(changed)
+        return changed
+
+    def suggestions(self, limit=None):
+        """Pending (disease, symptom) pairs, best supported first."""
+        query = ('SELECT disease, symptom, reports, first_seen, last_seen FROM support '
+                 'ORDER BY reports DESC, last_seen DESC')
+        params = ()
+        if limit is not None:
+            query += ' LIMIT ?'
+            params = (limit,)
+        return [
+            {
+                'disease': disease.replace('_', ' '),
+                'symptom': symptom,
+                'reports': reports,
+                'needed': max(self.threshold - reports, 0),
+                'firstSeen': first_seen,
+                'lastSeen': last_seen,
+            }
+            for disease, symptom, reports, first_seen, last_seen in self._connection().execute(query, params)
+        ]
@@ -5,6 +5,10 @@ import json
 import logging
 from flask_cors import CORS
 
+from disease_info import DiseaseInfo
+from kb_version import bump_version
+from knowledge_store import open_store
+
 app = Flask(__name__)
 CORS(app)
 
@@ -13,10 +17,13 @@ class DiseaseDiagnosis:
     def __init__(self):
         self.dataPath = os.path.abspath(os.path.join(os.getcwd(), 'data'))
         self.diseasePath = os.path.join(self.dataPath, 'disease-symptoms.clp')
+        # The rule files are generated from the store, so edits go there
+        self.store = open_store(self.dataPath)
         self.env = Environment()
         self.load_environment()
 
     def load_environment(self):
+        self.store.sync_files(self.dataPath)
         self.env.clear()  # Clear the environment before reloading
         self.env.load(self.diseasePath)
         logging.info("CLIPS environment loaded with rules from disease-symptoms.clp")
@@ -26,7 +33,7 @@ class DiseaseDiagnosis:
         logging.info("CLIPS environment reset.")
 
     def addSymptom(self, symptom):
-        text = f'(assert (has_symptom {symptom}))'
+        text = f'(assert (has_symptom (name {symptom})))'
         self.env.eval(text)
 
     def run(self):
@@ -34,24 +41,20 @@ class DiseaseDiagnosis:
 
     def getDiseases(self):
         diseases = []
-        for fact in self.env.facts():
-            fact = str(fact)
-            if "disease_is" in fact:
-                disease = fact[1:-1].split(" ")[1]
-                disease = disease.replace("_", " ")
-                disease = disease.title()
-                diseases.append(disease)
+        for fact in self.env.find_template('disease_is').facts():
+            disease = fact['name']
+            disease = disease.replace("_", " ")
+            disease = disease.title()
+            diseases.append(disease)
         return diseases
 
     def getSymptoms(self):
         symptoms = []
-        for fact in self.env.facts():
-            fact = str(fact)
-            if "has_symptom" in fact:
-                symptom = fact[1:-1].split(" ")[1]
-                symptom = symptom.replace("_", " ")
-                symptom = symptom.title()
-                symptoms.append(symptom)
+        for fact in self.env.find_template('has_symptom').facts():
+            symptom = fact['name']
+            symptom = symptom.replace("_", " ")
+            symptom = symptom.title()
+            symptoms.append(symptom)
         return symptoms
 
     def getSymptomList(self):
@@ -61,75 +64,18 @@ class DiseaseDiagnosis:
         return symptoms
 
     def add_new_symptom(self, rule_name, symptom):
-        path = os.path.join(self.dataPath, 'symptoms.txt')
-        diseasePath = os.path.join(self.dataPath, 'disease-symptoms.clp')
-
-        # Update symptoms.txt
-        with open(path, "r") as f:
-            symptoms = [line.strip() for line in f]
-
-        if symptom not in symptoms:
-            with open(path, "a") as f:
-                f.write(f"{symptom}\n")
-
-        # Update CLIPS file
-        with open(diseasePath, "r") as f:
-            lines = f.readlines()
-
-        found_disease = False
-        new_lines = []
-        for line in lines:
-            new_line = line
-            if rule_name.lower() in line.lower():
-                found_disease = True
-            if "=>" in line and found_disease:
-                new_line = line.replace("=>", f"(has_symptom {symptom})\n\t=>")
-                found_disease = False
-            new_lines.append(new_line)
-
-        with open(diseasePath, "w") as f:
-            f.writelines(new_lines)
-
+        disease = rule_name[len('is_it_'):] if rule_name.startswith('is_it_') else rule_name
+        if not self.store.add_symptoms(disease, [symptom]):
+            return
+        self.publish([f"is_it_{self.store.disease(disease)[1]}"])
+
+    def publish(self, rule_names):
+        """Regenerate the rule files from the store, tell the other services, and reload"""
+        self.store.sync_files(self.dataPath)
+        bump_version(self.dataPath, rule_names)
         self.load_environment()  # Reload the environment with the updated knowledge base
 
 
-class DiseaseInfo:
-    def __init__(self):
-        self.descriptions = self._getDescriptions()
-        self.precautions = self._getPrecautions()
-
-    def detail(self, diseases):
-        data = []
-        for disease in diseases:
-            disease_key = disease.lower().strip().replace(" ", "_")
-            oneData = {
-                'name': disease,
-                'description': self.descriptions.get(disease_key, "Description not available."),
-                'precautions': self.precautions.get(disease_key, [])
-            }
-            data.append(oneData)
-        return data
-
-    def _getDescriptions(self):
-        data = {}
-        with open("./data/disease-description.csv", "r") as f:
-            for line in f:
-                parts = line.strip().split(',')
-                disease_key = parts[0].lower().strip().replace(" ", "_")
-                data[disease_key] = ",".join(parts[1:]).replace("\"", "")
-        return data
-
-    def _getPrecautions(self):
-        data = {}
-        with open("./data/disease-precaution.csv", "r") as f:
-            for line in f:
-                parts = line.strip().split(',')
-                disease_key = parts[0].lower().strip().replace(" ", "_")
-                precautions = [prec.strip().capitalize() for prec in parts[1:] if prec.strip()]
-                data[disease_key] = precautions
-        return data
-
-
 def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.urandom(24).hex()
@@ -161,40 +107,15 @@ def create_app():
             disease_precautions = [prec.strip() for prec in data['diseasePrecautions'].split(',')]
             new_symptoms = [sym.strip().replace(' ', '_').lower() for sym in data['newSymptoms'].split(',')]
 
-            # Check if the disease already exists
-            disease_exists = any(f"(defrule {disease_name}" in line for line in open(engine.diseasePath))
-            if disease_exists:
+            added = engine.store.add_disease(
+                disease_name, new_symptoms,
+                description=disease_description, precautions=disease_precautions
+            )
+            if not added:
                 return jsonify(
                     {'status': 'error', 'message': f"Disease '{disease_name.replace('_', ' ')}' already exists."}), 409
 
-            # Update files
-            with open(os.path.join(engine.dataPath, 'symptoms.txt'), "a") as f:
-                for symptom in new_symptoms:
-                    if symptom not in engine.getSymptoms():
-                        f.write(f"{symptom},\n")
-
-            with open(os.path.join(engine.dataPath, 'disease-description.csv'), "a") as f:
-                f.write(f"{disease_name.replace('_', ' ')},{disease_description}\n")
-
-            with open(os.path.join(engine.dataPath, 'disease-precaution.csv'), "a") as f:
-                f.write(f"{disease_name.replace('_', ' ')},{','.join(disease_precautions)}\n")
-
-            with open(os.path.join(engine.dataPath, 'disease-symptoms.clp'), "a") as f:
-                f.write(f"\n(defrule {disease_name}\n")
-                f.write(f"  (disease_is {disease_name})\n")
-                f.write(f"  =>\n")
-                f.write(f"  (printout t \"{disease_name.replace('_', ' ')}\" crlf)\n")
-                f.write(f")\n")
-
-                f.write(f"\n(defrule is_it_{disease_name}\n")
-                for symptom in new_symptoms:
-                    f.write(f"  (has_symptom {symptom})\n")
-                f.write(f"  =>\n")
-                f.write(f"  (assert (disease_is {disease_name}))\n")
-                f.write(f")\n")
-
-            # Reload environment
-            engine.load_environment()
+            engine.publish([disease_name, f"is_it_{disease_name}"])
 
             return jsonify({'status': 'success'}), 201
         except Exception as e:
@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Finished jobs kept around for status queries; older ones are forgotten.
+MAX_FINISHED_JOBS = 100
+
+
+class Job:
+    """One queued unit of work and what is known about its progress.
+
+    The worker updates progress in place while the job runs, so a status
+    request can report rows processed before the job finishes.
+    """
+
+    def __init__(self, kind, func, args):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.status = 'queued'
+        self.progress = {'rows': 0}
+        self.errors = []
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def snapshot(self):
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished or time.time()) - self.started
+        rows = self.progress.get('rows', 0)
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'rowsPerSecond': round(rows / elapsed) if elapsed else 0,
+            'seconds': round(elapsed, 3),
+            'errors': list(self.errors),
+            'result': self.result,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobQueue:
+    """Run submitted jobs one at a time on a background thread.
+
+    func(progress, *args) is called with the job's progress dict, which it
+    may update as it goes; its return value becomes the job's result and
+    an exception marks the job failed. Jobs run in submission order, so
+    two imports never write to the knowledge base at once.
+    """
+
+    def __init__(self, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+
+    def submit(self, kind, func, *args):
+        job = Job(kind, func, args)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._forget_finished()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+        return job
+
+    def get(self, job_id):
+        """Status of a job as a plain dict, or None if it is unknown or long finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = job.snapshot()
+            if job.status == 'queued':
+                snapshot['position'] = self._pending.index(job) + 1
+            return snapshot
+
+    def _forget_finished(self):
+        # Called with the lock held.
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                job = self._pending.pop(0)
+                job.status = 'running'
+                job.started = time.time()
+
+            try:
+                result = job.func(job.progress, *job.args)
+            except Exception as e:
+                logging.error(f"Job {job.id} ({job.kind}) failed: {e}")
+                with self._lock:
+                    job.errors.append(str(e))
+                    job.status = 'failed'
+                    job.finished = time.time()
+            else:
+                with self._lock:
+                    job.result = result
+                    job.status = 'done'
+                    job.finished = time.time()
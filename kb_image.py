@@ -0,0 +1,69 @@
+import os
+import logging
+import threading
+
+from clips import Environment, Router
+
+_write_lock = threading.Lock()
+
+
+class _WarningSink(Router):
+    """Drops CLIPS warnings. bsave warns that slot constraints aren't saved,
+    which is harmless here: the fact templates declare none."""
+
+    def __init__(self):
+        super().__init__('bsave-warnings', 30)
+
+    def query(self, name):
+        return name == 'stdwrn'
+
+    def write(self, name, message):
+        pass
+
+
+def binary_image_path(clp_path):
+    """Path of the bsave image kept next to a .clp rule file."""
+    return os.path.splitext(clp_path)[0] + '.bin'
+
+
+def image_is_current(clp_path):
+    """True if a binary image exists and is at least as new as the text rules."""
+    image_path = binary_image_path(clp_path)
+    try:
+        return os.stat(image_path).st_mtime_ns >= os.stat(clp_path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def write_binary_image(clp_path):
+    """Parse clp_path once and bsave the result next to it.
+
+    The image is stamped with the mtime the text file had when it was
+    parsed, so an edit that lands while the image is being written still
+    leaves the image looking stale.
+    """
+    image_path = binary_image_path(clp_path)
+    tmp_path = image_path + '.tmp'
+    with _write_lock:
+        source_mtime = os.stat(clp_path).st_mtime_ns
+        env = Environment()
+        env.add_router(_WarningSink())
+        env.load(clp_path)
+        env.save(tmp_path, binary=True)
+        os.utime(tmp_path, ns=(source_mtime, source_mtime))
+        os.replace(tmp_path, image_path)
+    logging.info(f"Wrote binary knowledge-base image {image_path}")
+    return image_path
+
+
+def refresh_binary_image(clp_path):
+    """Rebuild the binary image in the background so edits don't wait on a full parse."""
+    def refresh():
+        try:
+            write_binary_image(clp_path)
+        except Exception as e:
+            logging.error(f"Failed to write binary image for {clp_path}: {e}")
+
+    thread = threading.Thread(target=refresh, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,51 @@
+import threading
+
+from kb_version import read_version
+
+
+class KnowledgeBaseIndex:
+    """In-memory view of the diseases in the knowledge store, keyed by their IDs.
+
+    IDs are the store's disease IDs, so they are stable: inserting or
+    removing a disease never renumbers the others. The view is rebuilt
+    only when the store's revision moves.
+    """
+
+    def __init__(self, store, data_path):
+        self.store = store
+        self.data_path = data_path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._entries = {}
+
+    def refresh(self):
+        """Rebuild if the store changed since the last build; returns the ETag."""
+        stamp = (read_version(self.data_path), self.store.revision())
+        with self._lock:
+            if stamp != self._stamp:
+                entries = {}
+                for disease_id, name, _, symptoms in self.store.diseases():
+                    entries[disease_id] = {
+                        'id': disease_id,
+                        'disease': name.replace('_', ' '),
+                        'symptoms': symptoms
+                    }
+                self._entries = entries
+                self._stamp = stamp
+            return '"%d-%d"' % self._stamp
+
+    def get(self, disease_id):
+        self.refresh()
+        with self._lock:
+            return self._entries.get(disease_id)
+
+    def page(self, offset=0, limit=None, prefix=None):
+        """Return (total matching, entries) in rule-file order, optionally filtered by disease-name prefix."""
+        self.refresh()
+        with self._lock:
+            entries = list(self._entries.values())
+        if prefix:
+            prefix = prefix.lower()
+            entries = [entry for entry in entries if entry['disease'].lower().startswith(prefix)]
+        end = None if limit is None else offset + limit
+        return len(entries), entries[offset:end]
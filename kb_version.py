@@ -0,0 +1,198 @@
+import os
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+VERSION_FILE_NAME = 'kb.version'
+CHANGES_FILE_NAME = 'kb.changes'
+# Readers further behind than this many versions fall back to a full reload.
+MAX_CHANGES = 1000
+
+
+def version_path(data_path):
+    return os.path.join(data_path, VERSION_FILE_NAME)
+
+
+def changes_path(data_path):
+    return os.path.join(data_path, CHANGES_FILE_NAME)
+
+
+def read_version(data_path):
+    """Current knowledge-base version for data_path, 0 if it has never been bumped."""
+    try:
+        with open(version_path(data_path), 'r') as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_version(data_path, rules=None):
+    """Increment the knowledge-base version after any write to the rule or info files.
+
+    The version lives in a file next to the rules so that every process
+    serving the same data directory sees the same counter. It is replaced
+    atomically, so readers never see a half-written number.
+
+    rules names the defrules the write touched; it is recorded in a short
+    change log so readers can rebuild just those. None means the change
+    can't be described rule by rule and readers must reload everything.
+    """
+    os.makedirs(data_path, exist_ok=True)
+    path = version_path(data_path)
+    with open(path + '.lock', 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            version = read_version(data_path) + 1
+            _append_change(data_path, version, rules)
+            with open(path + '.tmp', 'w') as f:
+                f.write(str(version))
+            os.replace(path + '.tmp', path)
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    return version
+
+
+def _append_change(data_path, version, rules):
+    # Called with the version lock held.
+    path = changes_path(data_path)
+    try:
+        with open(path, 'r') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        lines = []
+    lines.append(f"{version}\t{'*' if rules is None else ' '.join(sorted(set(rules)))}\n")
+    with open(path + '.tmp', 'w') as f:
+        f.writelines(lines[-MAX_CHANGES:])
+    os.replace(path + '.tmp', path)
+
+
+def changes_since(data_path, version):
+    """Return [(version, rule names or None)] for every bump after version.
+
+    Returns None if the log no longer reaches back that far.
+    """
+    try:
+        with open(changes_path(data_path), 'r') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+
+    changes = []
+    for line in lines:
+        number, _, names = line.rstrip('\n').partition('\t')
+        number = int(number)
+        if number > version:
+            changes.append((number, None if names == '*' else set(names.split())))
+    expected = read_version(data_path) - version
+    if len(changes) < expected or (changes and changes[0][0] != version + 1):
+        return None
+    return changes
+
+
+class KnowledgeBaseVersion:
+    """Cheap repeated reads of the version file: it is only reopened when the file changes."""
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self._stamp = None
+        self._version = 0
+
+    def current(self):
+        try:
+            st = os.stat(version_path(self.data_path))
+        except FileNotFoundError:
+            return 0
+        # Every bump replaces the file, so the inode changes even when two
+        # bumps land within one mtime tick.
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp != self._stamp:
+            self._version = read_version(self.data_path)
+            self._stamp = stamp
+        return self._version
+
+    def bump(self, rules=None):
+        return bump_version(self.data_path, rules)
+
+
+class KnowledgeBaseWatcher:
+    """Poll the version file and report changes made by any process.
+
+    on_change(rules) is called from the watcher thread with the set of
+    changed rule names, or None when readers should reload everything.
+    Edits made by this process go through bump(), which advances the
+    served generation straight away and keeps the change from being
+    reported back.
+    """
+
+    def __init__(self, data_path, on_change, interval=1.0):
+        self.version = KnowledgeBaseVersion(data_path)
+        self.on_change = on_change
+        self.interval = interval
+        # The generation this process is currently serving.
+        self.generation = self.version.current()
+        self._acknowledged = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def current(self):
+        return self.generation
+
+    def bump(self, rules=None):
+        version = self.version.bump(rules)
+        with self._lock:
+            if version == self.generation + 1:
+                self.generation = version
+            else:
+                # Someone else's change is in between; poll() still has to apply it.
+                self._acknowledged.add(version)
+        return version
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error(f"Knowledge-base watcher failed: {e}")
+
+    def poll(self):
+        current = self.version.current()
+        with self._lock:
+            if current <= self.generation:
+                return
+            changes = changes_since(self.version.data_path, self.generation)
+            acknowledged = self._acknowledged
+            self._acknowledged = {v for v in acknowledged if v > current}
+
+        rules = set()
+        if changes is None:
+            rules = None
+        else:
+            for number, names in changes:
+                if number in acknowledged:
+                    continue
+                if names is None:
+                    rules = None
+                    break
+                rules.update(names)
+
+        if rules is None or rules:
+            logging.info(f"Knowledge base moved from version {self.generation} to {current}")
+            self.on_change(rules)
+        with self._lock:
+            self.generation = max(self.generation, current)
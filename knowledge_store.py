@@ -0,0 +1,561 @@
+"""SQLite store holding the whole knowledge base for one data directory.
+
+Diseases, their rule symptoms, the symptom vocabulary, descriptions and
+precautions all live in data/knowledge.db and every write is a single
+transaction. disease-symptoms.clp and symptoms.txt are generated from the
+store whenever they are older than it; they are outputs, not sources, and
+hand edits to them are overwritten. The first time a data directory is
+opened, the store is filled from the files already there.
+"""
+import hashlib
+import itertools
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from clp_parser import RuleRecord, declares_templates, iter_rules
+from clp_rules import TEMPLATES
+
+DB_FILE_NAME = 'knowledge.db'
+# Order of the has_symptom patterns in generated rules: 'curated' keeps the
+# order they were entered in, 'rarest' puts the symptoms used by the fewest
+# rules first. Every service sharing a data directory must use the same one.
+PATTERN_ORDER = os.environ.get('CLP_PATTERN_ORDER', 'curated')
+# 0 writes lean rule files: only the is_it_ rules, without the companion
+# rule per disease whose one action is (printout t "Name" crlf).
+PRINTOUT_RULES = os.environ.get('CLP_PRINTOUT_RULES', '1') == '1'
+# Layout the generated .clp is written in; files in another layout are
+# rewritten, every rule re-ordered or stripped, on the next sync.
+CLP_LAYOUTS = {'curated': 1, 'rarest': 2}
+LEAN_LAYOUT = 4
+# Set on every file that declares the has_symptom/disease_is deftemplates;
+# files from before them use ordered facts and are rewritten.
+TEMPLATE_LAYOUT = 8
+# Disease and symptom names are written into the generated rules as bare
+# CLIPS symbols: no whitespace or characters CLIPS reads as delimiters or
+# constraints, and no leading ? or $ that would make them variables.
+NAME_PATTERN = re.compile(r'[^\s"()&|<~;?$][^\s"()&|<~;]*\Z')
+# upsert_diseases reports changed diseases by name up to this many, then just counts them.
+MAX_TRACKED_CHANGES = 1000
+
+CLP_HEADER = """; ------------------------------------------------------------------------------
+; this file is generated from knowledge.db - edit the knowledge base, not this file
+; dataset: https://www.kaggle.com/itachi9604/disease-symptom-description-dataset
+; ------------------------------------------------------------------------------
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS diseases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL UNIQUE,
+    display_name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS diseases_position ON diseases (position);
+CREATE TABLE IF NOT EXISTS symptoms (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS disease_symptoms (
+    disease_id INTEGER NOT NULL REFERENCES diseases (id) ON DELETE CASCADE,
+    symptom_id INTEGER NOT NULL REFERENCES symptoms (id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (disease_id, symptom_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS disease_symptoms_symptom ON disease_symptoms (symptom_id);
+CREATE TABLE IF NOT EXISTS descriptions (
+    disease_key TEXT PRIMARY KEY,
+    description TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS precautions (
+    disease_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    precaution TEXT NOT NULL,
+    PRIMARY KEY (disease_key, position)
+) WITHOUT ROWID;
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def disease_key(name):
+    """Lookup key shared by rules, descriptions and precautions: 'Hepatitis A' -> 'hepatitis_a'."""
+    return name.lower().strip().replace(' ', '_')
+
+
+def check_name(name):
+    """Return name if the rules can use it as a CLIPS symbol; raise ValueError otherwise."""
+    if not isinstance(name, str) or not NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid name {name!r}: names must be non-empty, without spaces "
+                         f"or any of ( ) & | < ~ ; \", and must not start with ? or $")
+    return name
+
+
+def thread_connection(local, db_path):
+    """The calling thread's autocommit connection to db_path, kept on the threading.local local."""
+    # sqlite3 connections can't be shared between threads; keep one per thread.
+    db = getattr(local, 'db', None)
+    if db is None:
+        db = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA foreign_keys=ON')
+        local.db = db
+    return db
+
+
+def open_store(data_path):
+    """The process-wide store for data_path, created and filled from its files on first use."""
+    data_path = os.path.abspath(data_path)
+    with _stores_lock:
+        store = _stores.get(data_path)
+        if store is None:
+            store = _stores[data_path] = KnowledgeStore(os.path.join(data_path, DB_FILE_NAME))
+            store.bootstrap(data_path)
+        return store
+
+
+class KnowledgeStore:
+    """Transactional access to knowledge.db.
+
+    Every write goes through transaction(), which also advances the
+    store's revision when anything changed; sync_files() compares that
+    revision with the one the generated files were written at.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as db:
+            db.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        with self.transaction() as db:
+            columns = [row[1] for row in db.execute('PRAGMA table_info(diseases)')]
+            if 'content_hash' not in columns:
+                db.execute('ALTER TABLE diseases ADD COLUMN content_hash TEXT')
+            for (disease_id,) in db.execute('SELECT id FROM diseases WHERE content_hash IS NULL').fetchall():
+                self._rehash(db, disease_id)
+
+    def _connection(self):
+        return thread_connection(self._local, self.db_path)
+
+    @contextmanager
+    def transaction(self):
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            changes = db.total_changes
+            yield db
+            if db.total_changes != changes:
+                db.execute("INSERT INTO meta (key, value) VALUES ('revision', 1) "
+                           "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _meta(self, db, key):
+        row = db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def revision(self):
+        return self._meta(self._connection(), 'revision')
+
+    # -- bootstrap ---------------------------------------------------------
+
+    def bootstrap(self, data_path):
+        """Import the rule, symptom, description and precaution files if the store is empty."""
+        clp_path = os.path.join(data_path, 'disease-symptoms.clp')
+        with self.transaction() as db:
+            if db.execute('SELECT 1 FROM meta WHERE key = ?', ('revision',)).fetchone():
+                return
+            self._import_rules(db, clp_path)
+            self._import_symptoms(db, os.path.join(data_path, 'symptoms.txt'))
+            self._import_descriptions(db, os.path.join(data_path, 'disease-description.csv'))
+            self._import_precautions(db, os.path.join(data_path, 'disease-precaution.csv'))
+        # The files were just imported, so they already say what the store says;
+        # only a file still using ordered facts has to be rewritten.
+        layout = CLP_LAYOUTS['curated']
+        if os.path.exists(clp_path) and declares_templates(clp_path):
+            layout |= TEMPLATE_LAYOUT
+        self._mark_synced(layout)
+
+    def _import_rules(self, db, clp_path):
+        if not os.path.exists(clp_path):
+            return
+        display_names = {}
+        symptoms = {}
+        for rule in iter_rules(clp_path):
+            if rule.disease is not None:
+                symptoms[rule.disease] = rule.symptoms
+                display_names.setdefault(rule.disease, None)
+            else:
+                display_names[rule.name] = _printout_text(rule)
+        for name, display_name in display_names.items():
+            self._upsert_disease(db, name, symptoms.get(name, []), display_name)
+
+    def _import_symptoms(self, db, symptoms_path):
+        if not os.path.exists(symptoms_path):
+            return
+        with open(symptoms_path, 'r') as f:
+            names = [line.strip().rstrip(',') for line in f]
+        self._symptom_ids(db, [name for name in names if name])
+
+    def _import_descriptions(self, db, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            next(f, None)  # header row
+            for line in f:
+                parts = line.strip().split(',')
+                if parts[0]:
+                    self._set_description(db, parts[0], ",".join(parts[1:]).replace("\"", ""))
+
+    def _import_precautions(self, db, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            next(f, None)  # header row
+            for line in f:
+                parts = line.strip().split(',')
+                if parts[0]:
+                    self._set_precautions(db, parts[0], [prec for prec in parts[1:] if prec.strip()])
+
+    # -- writes (call inside transaction()) ----------------------------------
+
+    def _symptom_ids(self, db, names):
+        ids = []
+        for name in names:
+            check_name(name)
+            db.execute('INSERT OR IGNORE INTO symptoms (name) VALUES (?)', (name,))
+            ids.append(db.execute('SELECT id FROM symptoms WHERE name = ?', (name,)).fetchone()[0])
+        return ids
+
+    def _disease_row(self, db, name):
+        return db.execute('SELECT id, name FROM diseases WHERE key = ?', (disease_key(name),)).fetchone()
+
+    def _upsert_disease(self, db, name, symptoms, display_name=None):
+        """Add or replace a disease; returns (disease id, 'inserted' | 'updated' | 'unchanged')."""
+        check_name(name)
+        if display_name is None:
+            display_name = name.replace('_', ' ')
+        content_hash = _content_hash(display_name, symptoms)
+        row = db.execute('SELECT id, content_hash FROM diseases WHERE key = ?', (disease_key(name),)).fetchone()
+        if row is None:
+            position = db.execute('SELECT COALESCE(MAX(position), 0) + 1 FROM diseases').fetchone()[0]
+            disease_id = db.execute(
+                'INSERT INTO diseases (name, key, display_name, position, content_hash) VALUES (?, ?, ?, ?, ?)',
+                (name, disease_key(name), display_name, position, content_hash)).lastrowid
+            status = 'inserted'
+        elif row[1] == content_hash:
+            return row[0], 'unchanged'
+        else:
+            disease_id = row[0]
+            db.execute('UPDATE diseases SET display_name = ?, content_hash = ? WHERE id = ?',
+                       (display_name, content_hash, disease_id))
+            db.execute('DELETE FROM disease_symptoms WHERE disease_id = ?', (disease_id,))
+            status = 'updated'
+        self._append_symptoms(db, disease_id, symptoms, rehash=False)
+        return disease_id, status
+
+    def _rehash(self, db, disease_id):
+        display_name = db.execute('SELECT display_name FROM diseases WHERE id = ?', (disease_id,)).fetchone()[0]
+        symptoms = [row[0] for row in db.execute(
+            'SELECT s.name FROM disease_symptoms ds JOIN symptoms s ON s.id = ds.symptom_id WHERE ds.disease_id = ?',
+            (disease_id,))]
+        db.execute('UPDATE diseases SET content_hash = ? WHERE id = ?',
+                   (_content_hash(display_name, symptoms), disease_id))
+
+    def _append_symptoms(self, db, disease_id, symptoms, rehash=True):
+        position = db.execute('SELECT COALESCE(MAX(position), 0) FROM disease_symptoms WHERE disease_id = ?',
+                              (disease_id,)).fetchone()[0]
+        added = []
+        for name, symptom_id in zip(symptoms, self._symptom_ids(db, symptoms)):
+            inserted = db.execute(
+                'INSERT OR IGNORE INTO disease_symptoms (disease_id, symptom_id, position) VALUES (?, ?, ?)',
+                (disease_id, symptom_id, position + 1)).rowcount
+            if inserted:
+                position += 1
+                added.append(name)
+        if added and rehash:
+            self._rehash(db, disease_id)
+        return added
+
+    def _delete_symptoms(self, db, disease_id, symptoms):
+        removed = 0
+        for symptom in symptoms:
+            removed += db.execute(
+                'DELETE FROM disease_symptoms WHERE disease_id = ? '
+                'AND symptom_id = (SELECT id FROM symptoms WHERE name = ?)',
+                (disease_id, symptom)).rowcount
+        if removed:
+            self._rehash(db, disease_id)
+        return removed
+
+    def _set_description(self, db, disease, description):
+        db.execute('INSERT OR REPLACE INTO descriptions (disease_key, description) VALUES (?, ?)',
+                   (disease_key(disease), description))
+
+    def _set_precautions(self, db, disease, precautions):
+        key = disease_key(disease)
+        db.execute('DELETE FROM precautions WHERE disease_key = ?', (key,))
+        db.executemany('INSERT INTO precautions (disease_key, position, precaution) VALUES (?, ?, ?)',
+                       [(key, i, precaution) for i, precaution in enumerate(precautions)])
+
+    # -- writes ----------------------------------------------------------------
+
+    def add_disease(self, name, symptoms, display_name=None, description=None, precautions=None):
+        """Add a new disease; returns False without writing anything if it already exists."""
+        with self.transaction() as db:
+            if self._disease_row(db, name) is not None:
+                return False
+            self._upsert_disease(db, name, symptoms, display_name)
+            if description is not None:
+                self._set_description(db, name, description)
+            if precautions is not None:
+                self._set_precautions(db, name, precautions)
+            return True
+
+    def upsert_diseases(self, diseases, batch_size=1000, on_batch=None):
+        """Add or replace (name, symptoms, display_name) diseases from any iterable, batch_size per transaction.
+
+        A disease whose display name and symptom set hash the same as what
+        is stored is left alone. Returns the inserted/updated/unchanged
+        counts and 'changed', the names of inserted or updated diseases
+        (None once there are more than MAX_TRACKED_CHANGES). on_batch, if
+        given, is called with those counts after every committed batch.
+        """
+        result = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'changed': []}
+        diseases = iter(diseases)
+        while True:
+            batch = list(itertools.islice(diseases, batch_size))
+            if not batch:
+                return result
+            with self.transaction() as db:
+                for name, symptoms, display_name in batch:
+                    _, status = self._upsert_disease(db, name, symptoms, display_name)
+                    result[status] += 1
+                    if status != 'unchanged' and result['changed'] is not None:
+                        result['changed'].append(name)
+                        if len(result['changed']) > MAX_TRACKED_CHANGES:
+                            result['changed'] = None
+            if on_batch is not None:
+                on_batch(result)
+
+    def add_symptoms(self, disease, symptoms):
+        """Add symptoms to a disease's rule; returns the ones it didn't have, or None if there is no such disease."""
+        with self.transaction() as db:
+            row = self._disease_row(db, disease)
+            if row is None:
+                return None
+            return self._append_symptoms(db, row[0], symptoms)
+
+    def remove_symptoms(self, disease, symptoms):
+        """Remove symptoms from a disease's rule; returns how many were removed, or None if there is no such disease."""
+        with self.transaction() as db:
+            row = self._disease_row(db, disease)
+            if row is None:
+                return None
+            return self._delete_symptoms(db, row[0], symptoms)
+
+    def apply_edits(self, edits):
+        """Apply a list of edits in one transaction; returns the names of the rules they changed.
+
+        Each edit is ('add', disease, symptoms), ('remove', disease,
+        symptoms) or ('create', name, symptoms, display_name); create
+        replaces a disease that already exists. Edits run in order, so a
+        disease created early in the list can be edited later in it.
+        Raises KeyError naming the first disease that doesn't exist, and
+        then nothing is applied.
+        """
+        changed = set()
+        with self.transaction() as db:
+            for edit in edits:
+                if edit[0] == 'create':
+                    _, name, symptoms, display_name = edit
+                    _, status = self._upsert_disease(db, name, symptoms, display_name)
+                    if status != 'unchanged':
+                        name = self._disease_row(db, name)[1]
+                        changed.update((name, f"is_it_{name}"))
+                    continue
+
+                action, disease, symptoms = edit
+                row = self._disease_row(db, disease)
+                if row is None:
+                    raise KeyError(disease)
+                if action == 'add':
+                    touched = self._append_symptoms(db, row[0], symptoms)
+                else:
+                    touched = self._delete_symptoms(db, row[0], symptoms)
+                if touched:
+                    changed.add(f"is_it_{row[1]}")
+        return changed
+
+    # -- reads -------------------------------------------------------------------
+
+    def disease(self, name):
+        """(id, rule name, display name) for a disease, matched case-insensitively, or None."""
+        return self._connection().execute(
+            'SELECT id, name, display_name FROM diseases WHERE key = ?', (disease_key(name),)).fetchone()
+
+    def diseases(self, names=None):
+        """Yield (id, rule name, display name, [symptoms]) for every disease (or those named), in rule-file order."""
+        db = self._connection()
+        where, keys = '', []
+        if names is not None:
+            keys = sorted({disease_key(name) for name in names})
+            where = f"WHERE d.key IN ({','.join('?' * len(keys))}) "
+        rows = db.execute(
+            'SELECT d.id, d.name, d.display_name, s.name FROM diseases d '
+            'LEFT JOIN disease_symptoms ds ON ds.disease_id = d.id '
+            'LEFT JOIN symptoms s ON s.id = ds.symptom_id '
+            f'{where}ORDER BY d.position, ds.position', keys)
+        for (disease_id, name, display_name), group in itertools.groupby(rows, key=lambda row: row[:3]):
+            yield disease_id, name, display_name, [row[3] for row in group if row[3] is not None]
+
+    def rules(self, names=None):
+        """Yield the CLIPS rules as RuleRecords: each disease's printout rule (unless
+        PRINTOUT_RULES is off), then its is_it_ rule.
+
+        names limits the output to those rule names (either rule of a disease).
+        With PATTERN_ORDER 'rarest' the has_symptom patterns of an is_it_
+        rule are ordered by how many rules use each symptom, fewest first,
+        ties in the curated order.
+        """
+        wanted = None if names is None else set(names)
+        diseases = None
+        if wanted is not None:
+            diseases = {name[len('is_it_'):] if name.startswith('is_it_') else name for name in wanted}
+        rows = self.diseases(diseases)
+        frequencies = None
+        if PATTERN_ORDER == 'rarest':
+            if wanted is None:
+                frequencies = self.symptom_frequencies()
+            else:
+                rows = list(rows)
+                frequencies = self.symptom_frequencies({symptom for row in rows for symptom in row[3]})
+        for _, name, display_name, symptoms in rows:
+            if frequencies is not None:
+                # CLIPS joins patterns in order; a rare first pattern keeps
+                # fewer partial matches alive, at the cost of less sharing
+                # between rules (see benchmarks/rule_order.py).
+                symptoms = sorted(symptoms, key=lambda symptom: frequencies.get(symptom, 0))
+            printout_rule = RuleRecord(name, None, [['disease_is', ['name', name]]],
+                                       [['printout', 't', _quote(display_name), 'crlf']])
+            is_it_rule = RuleRecord(f"is_it_{name}", None, [['has_symptom', ['name', symptom]] for symptom in symptoms],
+                                    [['assert', ['disease_is', ['name', name]]]])
+            for rule in (printout_rule, is_it_rule) if PRINTOUT_RULES else (is_it_rule,):
+                if wanted is None or rule.name in wanted:
+                    yield rule
+
+    def symptom_frequencies(self, symptoms=None):
+        """Map symptom name -> number of disease rules using it, for every symptom or just those given."""
+        db = self._connection()
+        query = ('SELECT s.name, COUNT(*) FROM disease_symptoms ds JOIN symptoms s ON s.id = ds.symptom_id')
+        if symptoms is None:
+            return dict(db.execute(query + ' GROUP BY ds.symptom_id'))
+        symptoms = list(symptoms)
+        frequencies = {}
+        for i in range(0, len(symptoms), 500):
+            chunk = symptoms[i:i + 500]
+            frequencies.update(db.execute(
+                query + f" WHERE s.name IN ({','.join('?' * len(chunk))}) GROUP BY ds.symptom_id", chunk))
+        return frequencies
+
+    def symptom_names(self):
+        return [row[0] for row in self._connection().execute('SELECT name FROM symptoms ORDER BY name')]
+
+    def details(self, keys):
+        """Map each disease key to (description or None, [precautions])."""
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        db = self._connection()
+        marks = ','.join('?' * len(keys))
+        descriptions = dict(db.execute(
+            f'SELECT disease_key, description FROM descriptions WHERE disease_key IN ({marks})', keys))
+        precautions = {}
+        for key, precaution in db.execute(
+                f'SELECT disease_key, precaution FROM precautions WHERE disease_key IN ({marks}) '
+                f'ORDER BY disease_key, position', keys):
+            precautions.setdefault(key, []).append(precaution)
+        return {key: (descriptions.get(key), precautions.get(key, [])) for key in keys}
+
+    # -- generated files ---------------------------------------------------------
+
+    def sync_files(self, data_path):
+        """Regenerate disease-symptoms.clp and symptoms.txt if the store has changed since they were written.
+
+        A file written in another PATTERN_ORDER or PRINTOUT_RULES mode is
+        also rewritten, which re-orders or strips every rule in it. Returns True if the files were rewritten.
+        """
+        clp_path = os.path.join(data_path, 'disease-symptoms.clp')
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            revision = self._meta(db, 'revision')
+            layout = CLP_LAYOUTS[PATTERN_ORDER] | (0 if PRINTOUT_RULES else LEAN_LAYOUT) | TEMPLATE_LAYOUT
+            # Files written before layouts existed are in curated order, with ordered facts.
+            written_layout = self._meta(db, 'files_layout') or CLP_LAYOUTS['curated']
+            if (self._meta(db, 'files_revision') == revision and written_layout == layout
+                    and os.path.exists(clp_path)):
+                db.execute('COMMIT')
+                return False
+            self._write_clp(clp_path)
+            self._write_symptoms(os.path.join(data_path, 'symptoms.txt'))
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('files_revision', ?)", (revision,))
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('files_layout', ?)", (layout,))
+            db.execute('COMMIT')
+            return True
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _mark_synced(self, layout):
+        db = self._connection()
+        db.execute("INSERT OR REPLACE INTO meta (key, value) "
+                   "VALUES ('files_revision', (SELECT value FROM meta WHERE key = 'revision'))")
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('files_layout', ?)", (layout,))
+
+    def _write_clp(self, clp_path):
+        with open(clp_path + '.tmp', 'w') as f:
+            f.write(CLP_HEADER)
+            f.write("\n")
+            f.writelines(TEMPLATES)
+            for rule in self.rules():
+                f.write("\n")
+                f.write(rule.to_source())
+        os.replace(clp_path + '.tmp', clp_path)
+
+    def _write_symptoms(self, symptoms_path):
+        with open(symptoms_path + '.tmp', 'w') as f:
+            f.writelines(f"{name}\n" for name in self.symptom_names())
+        os.replace(symptoms_path + '.tmp', symptoms_path)
+
+
+def _content_hash(display_name, symptoms):
+    text = "\0".join([display_name] + sorted(set(symptoms)))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _printout_text(rule):
+    for action in rule.actions:
+        if isinstance(action, list) and action[:1] == ['printout']:
+            for item in action[2:]:
+                if isinstance(item, str) and item.startswith('"'):
+                    return item[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return None
+
+
+def _quote(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
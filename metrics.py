@@ -0,0 +1,94 @@
+import bisect
+import threading
+import time
+
+from flask import g, request
+
+# Content type of the Prometheus text exposition format served at /metrics.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Bucket upper bounds in seconds, from 50us (a cached diagnosis) to 10s (a large CSV import).
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Latency histogram with one label, rendered in the Prometheus text format.
+
+    Recording a sample is a bisect into the fixed buckets and two
+    additions under a lock, a fraction of a microsecond, so it stays on
+    in production. Each process keeps its own counts.
+    """
+
+    def __init__(self, name, help, label, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        """Record one sample of the given duration under the given label value."""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(value)
+            if series is None:
+                # One count per bucket, then +Inf, then the running sum.
+                series = self._series[value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def stopwatch(self):
+        return Stopwatch(self)
+
+    def render(self):
+        with self._lock:
+            snapshot = {value: list(series) for value, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value in sorted(snapshot, key=str):
+            series = snapshot[value]
+            label = f'{self.label}="{_escape(value)}"'
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                total += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {total}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-1]:.9g}")
+            lines.append(f"{self.name}_count{{{label}}} {total}")
+        return '\n'.join(lines) + '\n'
+
+
+class Stopwatch:
+    """Times consecutive phases of one request: each lap records the time since the previous one."""
+
+    __slots__ = ('histogram', 'last')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.histogram.observe(phase, now - self.last)
+        self.last = now
+
+
+def render(*histograms):
+    return ''.join(histogram.render() for histogram in histograms)
+
+
+def time_requests(target, histogram):
+    """Record the duration of every request handled by a Flask app or blueprint, labelled by endpoint."""
+    @target.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @target.teardown_request
+    def stop_timer(exc):
+        started = g.pop('request_started', None)
+        if started is not None:
+            histogram.observe(request.endpoint, time.perf_counter() - started)
@@ -1,14 +1,92 @@
-import os
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Blueprint, render_template, request, jsonify, redirect
+from flask import Blueprint, render_template, request, jsonify, redirect, current_app
 import logging
 
-def main_routes(engine, info):
+from clp_rules import rule_name
+from engine_pool import EnginePoolExhausted
+from kb_image import refresh_binary_image
+from metrics import CONTENT_TYPE, Histogram, render, time_requests
+
+def main_routes(pool, info, cache, kb_watcher):
     routes = Blueprint('routes', __name__)
 
+    # Where /diagnose time goes, one series per phase; cached requests skip the engine phases.
+    phase_seconds = Histogram('diagnosis_phase_seconds', 'Time spent in each phase of a diagnosis.', 'phase')
+    request_seconds = Histogram('http_request_duration_seconds', 'Time to handle a request.', 'endpoint')
+    time_requests(routes, request_seconds)
+
+    def normalize_symptoms(symptoms):
+        return [symptom.replace(' ', '_').lower() for symptom in symptoms]
+
+    def diagnose_symptoms(engine, symptoms, watch=None):
+        if watch is None:
+            watch = phase_seconds.stopwatch()
+        engine.reset()
+        watch.lap('reset')
+        engine.addSymptoms(symptoms)
+        watch.lap('assert')
+        overrun = engine.run()
+        watch.lap('run')
+        diseases = engine.getDiseases()
+        watch.lap('diseases')
+
+        if overrun:
+            pool.record_overrun(engine.overrun_rules)
+            logging.warning(f"Diagnosis of {symptoms} stopped early ({overrun}); "
+                            f"rules still pending: {', '.join(engine.overrun_rules)}")
+            result = {
+                'status': 'partial',
+                'partial': True,
+                'reason': overrun,
+                'diseases': info.detail(diseases),
+                'message': 'The rules did not finish within their budget; these are the diseases found so far.'
+            }
+            watch.lap('detail')
+            return result
+
+        if not diseases:
+            return {
+                'status': 'success',
+                'diseases': [],
+                'message': 'No diseases detected, please add more symptoms.'
+            }
+
+        result = {
+            'status': 'success',
+            'diseases': info.detail(diseases)
+        }
+        watch.lap('detail')
+        return result
+
+    def diagnose_cases(cases):
+        # One engine checkout serves the whole slice; a bad case only fails itself.
+        results = []
+        # Read the version before checkout, as /diagnose does: the engine
+        # handed over may still have the rules of that version, and results
+        # must never be cached under a newer one.
+        version = kb_watcher.current()
+        with pool.checkout() as engine:
+            for case in cases:
+                try:
+                    symptoms = case['symptoms'] if isinstance(case, dict) else case
+                    if not isinstance(symptoms, list):
+                        raise ValueError("Each case must be a list of symptoms or an object with a 'symptoms' list.")
+                    symptoms = normalize_symptoms(symptoms)
+                    key = cache.key(symptoms, version)
+                    result = cache.get(key)
+                    if result is None:
+                        result = diagnose_symptoms(engine, symptoms)
+                        if not result.get('partial'):
+                            cache.put(key, result)
+                    results.append(result)
+                except Exception as e:
+                    results.append({'status': 'error', 'message': str(e)})
+        return results
+
     @routes.route('/', methods=['GET', 'POST'])
     def home():
-        return render_template('index.html', symptomList=engine.getSymptomList())
+        return render_template('index.html', symptomList=pool.getSymptomList())
 
     @routes.route('/addNewSymptom', methods=['POST'])
     def addNewSymptom():
@@ -16,8 +94,16 @@ def main_routes(engine, info):
             new_symptom = request.form['new_symptom'].replace(' ', '_').lower()
             disease_name = f"is_it_{request.form['diseaseName'].replace(' ', '_').lower()}"
 
-            engine.add_new_symptom(disease_name, new_symptom)
+            with pool.checkout() as engine:
+                rules = engine.add_new_symptom(disease_name, new_symptom)
+            if rules is None:
+                return jsonify({'status': 'error', 'message': f"Disease '{request.form['diseaseName']}' not found."}), 404
+            if rules:
+                pool.apply_rules(rules)
+                kb_watcher.bump([rule_name(rule) for rule in rules])
             return redirect('/')
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         except Exception as e:
             logging.error(f"Error adding new symptom: {e}")
             return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -29,40 +115,25 @@ def main_routes(engine, info):
             disease_name = data['diseaseName'].strip().replace(' ', '_').lower()
             disease_description = data['diseaseDescription'].strip()
             disease_precautions = [prec.strip() for prec in data['diseasePrecautions'].split(',')]
-            new_symptoms = [sym.strip().replace(' ', '_').lower() for sym in data['newSymptoms'].split(',')]
+            new_symptoms = [sym.strip().replace(' ', '_').lower() for sym in data['newSymptoms'].split(',') if sym.strip()]
 
-            disease_exists = any(f"(defrule {disease_name}" in line for line in open(engine.diseasePath))
-            if disease_exists:
+            added = pool.store.add_disease(
+                disease_name, new_symptoms,
+                description=disease_description, precautions=disease_precautions
+            )
+            if not added:
                 return jsonify({'status': 'error', 'message': f"Disease '{disease_name.replace('_', ' ')}' already exists."}), 409
 
-            with open(os.path.join(engine.dataPath, 'symptoms.txt'), "a") as f:
-                for symptom in new_symptoms:
-                    if symptom not in engine.getSymptoms():
-                        f.write(f"{symptom},\n")
-
-            with open(os.path.join(engine.dataPath, 'disease-description.csv'), "a") as f:
-                f.write(f"{disease_name.replace('_', ' ')},{disease_description}\n")
-
-            with open(os.path.join(engine.dataPath, 'disease-precaution.csv'), "a") as f:
-                f.write(f"{disease_name.replace('_', ' ')},{','.join(disease_precautions)}\n")
-
-            with open(os.path.join(engine.dataPath, 'disease-symptoms.clp'), "a") as f:
-                f.write(f"\n(defrule {disease_name}\n")
-                f.write(f"  (disease_is {disease_name})\n")
-                f.write(f"  =>\n")
-                f.write(f"  (printout t \"{disease_name.replace('_', ' ')}\" crlf)\n")
-                f.write(f")\n")
+            if pool.store.sync_files(pool.dataPath):
+                refresh_binary_image(pool.diseasePath)
+            rules = [rule.to_source() for rule in pool.store.rules([disease_name, f"is_it_{disease_name}"])]
 
-                f.write(f"\n(defrule is_it_{disease_name}\n")
-                for symptom in new_symptoms:
-                    f.write(f"  (has_symptom {symptom})\n")
-                f.write(f"  =>\n")
-                f.write(f"  (assert (disease_is {disease_name}))\n")
-                f.write(f")\n")
-
-            engine.load_environment()
+            pool.apply_rules(rules)
+            kb_watcher.bump([rule_name(rule) for rule in rules])
 
             return jsonify({'status': 'success'}), 201
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         except Exception as e:
             logging.error(f"Error adding new disease: {e}")
             return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -70,30 +141,94 @@ def main_routes(engine, info):
     @routes.route('/diagnose', methods=['POST'])
     def diagnose():
         try:
-            engine.reset()
-
+            watch = phase_seconds.stopwatch()
             data = request.get_json()
-            symptoms = [symptom.replace(' ', '_').lower() for symptom in data['symptoms']]
-
-            for symptom in symptoms:
-                engine.addSymptom(symptom)
+            symptoms = normalize_symptoms(data['symptoms'])
+            watch.lap('parse')
+
+            key = cache.key(symptoms, kb_watcher.current())
+            result = cache.get(key)
+            watch.lap('cache')
+            if result is None:
+                with pool.checkout() as engine:
+                    watch.lap('checkout')
+                    result = diagnose_symptoms(engine, symptoms, watch)
+                if result.get('partial'):
+                    # 504 when the deadline passed, 503 when the firing limit was reached.
+                    return jsonify(result), 504 if result['reason'] == 'deadline' else 503
+                cache.put(key, result)
+
+            response = jsonify(result)
+            watch.lap('jsonify')
+            return response
+        except EnginePoolExhausted as e:
+            logging.error(f"Error during diagnosis: {e}")
+            return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+        except Exception as e:
+            logging.error(f"Error during diagnosis: {e}")
+            return jsonify({'status': 'error', 'message': str(e)}), 500
 
-            engine.run()
-            diseases = engine.getDiseases()
+    @routes.route('/diagnose/batch', methods=['POST'])
+    def diagnose_batch():
+        try:
+            data = request.get_json()
+            cases = data['cases'] if isinstance(data, dict) else data
+            if not isinstance(cases, list):
+                return jsonify({'status': 'error', 'message': "Expected a list of cases."}), 400
+
+            max_items = current_app.config['BATCH_MAX_ITEMS']
+            if len(cases) > max_items:
+                return jsonify({'status': 'error', 'message': f"A batch may hold at most {max_items} cases."}), 413
+
+            workers = 1
+            if isinstance(data, dict):
+                workers = int(data.get('workers', 1))
+            workers = max(1, min(workers, current_app.config['BATCH_MAX_WORKERS'], pool.size, len(cases) or 1))
+
+            if workers == 1:
+                results = diagnose_cases(cases)
+            else:
+                # Contiguous slices keep results in input order when concatenated.
+                step = -(-len(cases) // workers)
+                slices = [cases[i:i + step] for i in range(0, len(cases), step)]
+                with ThreadPoolExecutor(max_workers=len(slices)) as executor:
+                    results = [result for chunk in executor.map(diagnose_cases, slices) for result in chunk]
+
+            return jsonify({'status': 'success', 'results': results})
+        except EnginePoolExhausted as e:
+            logging.error(f"Error during batch diagnosis: {e}")
+            return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+        except Exception as e:
+            logging.error(f"Error during batch diagnosis: {e}")
+            return jsonify({'status': 'error', 'message': str(e)}), 500
 
-            if not diseases:
-                return jsonify({
-                    'status': 'success',
-                    'diseases': [],
-                    'message': 'No diseases detected, please add more symptoms.'
-                })
+    @routes.route('/stats', methods=['GET'])
+    def stats():
+        return jsonify({
+            'pool': pool.stats(),
+            'cache': cache.stats(),
+            'kb_generation': kb_watcher.current(),
+        })
 
-            return jsonify({
-                'status': 'success',
-                'diseases': info.detail(diseases)
-            })
+    @routes.route('/debug/engine', methods=['GET', 'POST'])
+    def debug_engine():
+        try:
+            if request.method == 'POST':
+                data = request.get_json(silent=True) or {}
+                if 'sampling' in data:
+                    pool.set_sampling(bool(data['sampling']))
+                if data.get('clear'):
+                    pool.rule_stats.clear()
+            top = int(request.args.get('top', 20))
+            return jsonify(pool.introspect(top))
+        except EnginePoolExhausted as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': str(e.retry_after)}
         except Exception as e:
-            logging.error(f"Error during diagnosis: {e}")
+            logging.error(f"Error reading engine internals: {e}")
             return jsonify({'status': 'error', 'message': str(e)}), 500
 
+    @routes.route('/metrics', methods=['GET'])
+    def metrics():
+        return render(phase_seconds, request_seconds), 200, {'Content-Type': CONTENT_TYPE}
+
     return routes
@@ -1,37 +1,67 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import re
+import os
+
+from kb_version import KnowledgeBaseWatcher
+from knowledge_store import open_store
+from metrics import CONTENT_TYPE, Histogram, render, time_requests
+from symptom_index import SymptomIndex
 
 app = Flask(__name__)
 CORS(app)
 
 # File paths
-RULES_FILE_PATH = 'data/disease-symptoms.clp'
+RULES_FILE_PATH = os.environ.get('RULES_FILE_PATH', 'data/disease-symptoms.clp')
+# Seconds between checks for edits made by the knowledge-base editor (0 disables)
+KB_WATCH_INTERVAL = float(os.environ.get('KB_WATCH_INTERVAL', 1))
+# Largest number of symptom sets accepted by /api/diagnose/batch, as on the main service
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 10000))
+
+# Latency histograms served at /metrics
+PHASE_SECONDS = Histogram('diagnosis_phase_seconds', 'Time spent in each phase of a diagnosis.', 'phase')
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time to handle a request.', 'endpoint')
+time_requests(app, REQUEST_SECONDS)
 
 def load_rules(file_path):
-    """Load the rules from the given file path."""
-    try:
-        with open(file_path, 'r') as file:
-            rules = file.read()
-            print(f"Loaded rules from {file_path}")
-            return rules
-    except FileNotFoundError:
-        print(f"Rules file not found at path: {file_path}")
-        return ""
-
-def parse_rules(rules_text):
-    """Parse the rules text to extract symptoms and diseases."""
+    """Load the rules from the knowledge store kept next to the given rule file."""
+    store = open_store(os.path.dirname(os.path.abspath(file_path)))
+    rules = list(store.rules())
+    print(f"Loaded {len(rules)} rules from {store.db_path}")
+    return rules
+
+def parse_rules(rules):
+    """Parse the rule records to extract symptoms and diseases."""
     print("Parsing rules...")
-    rules = re.findall(r'\(defrule is_it_(\w+)(.*?)=>', rules_text, re.DOTALL)
     disease_symptoms = {}
 
-    for disease, rule in rules:
-        symptoms = re.findall(r'\(has_symptom (\w+)\)', rule)
-        disease_symptoms[disease] = set(symptoms)
-        print(f"Parsed disease '{disease}' with symptoms: {symptoms}")
+    for rule in rules:
+        if rule.disease is None:
+            continue
+        symptoms = rule.symptoms
+        disease_symptoms[rule.disease] = set(symptoms)
+        print(f"Parsed disease '{rule.disease}' with symptoms: {symptoms}")
 
     return disease_symptoms
 
+def reload_changed_rules(rule_names):
+    """Re-read the changed is_it_ rules (or every rule if rule_names is None) and swap in a new index."""
+    global disease_symptoms, symptom_index
+    if rule_names is None:
+        updated = parse_rules(load_rules(RULES_FILE_PATH))
+    else:
+        changed = {name for name in rule_names if name.startswith('is_it_')}
+        store = open_store(os.path.dirname(os.path.abspath(RULES_FILE_PATH)))
+        updated = dict(disease_symptoms)
+        for name in changed:
+            updated.pop(name[len('is_it_'):], None)
+        updated.update(parse_rules(store.rules(changed)))
+    symptom_index = SymptomIndex(updated)
+    disease_symptoms = updated
+    print(f"Reloaded rules, now serving {len(disease_symptoms)} diseases")
+
+def current_index():
+    return symptom_index
+
 def get_all_symptoms_from_rules(disease_symptoms):
     """Extract all unique symptoms from the rules."""
     print("Extracting all symptoms from parsed rules...")
@@ -55,23 +85,76 @@ def filter_remaining_symptoms(possible_diseases, disease_symptoms, selected_symp
     print(f"Remaining symptoms: {sorted(list(relevant_symptoms))}")
     return sorted(list(relevant_symptoms))
 
-def calculate_disease_matches(possible_diseases, disease_symptoms, selected_symptoms):
+def calculate_disease_matches(possible_diseases, symptom_index, selected_symptoms, top_k=None):
     """Calculate match percentages for each disease."""
     print("Calculating disease match percentages...")
-    matches = []
-    for disease in possible_diseases:
-        required_symptoms = disease_symptoms[disease]
-        matched = len(set(selected_symptoms).intersection(required_symptoms))
-        total = len(required_symptoms)
-        match_percentage = (matched / total) * 100 if total > 0 else 0
-        print(f"Disease '{disease}' match: {match_percentage}% ({matched}/{total} symptoms matched)")
-        matches.append({
-            'disease': disease,
-            'match_percentage': match_percentage,
-            'matched_symptoms': matched,
-            'total_symptoms': total
-        })
-    return sorted(matches, key=lambda x: x['match_percentage'], reverse=True)
+    ordinals = [symptom_index.ordinals[disease] for disease in possible_diseases]
+    matches = symptom_index.rank(ordinals, selected_symptoms, top_k)
+    print(f"Ranked {len(matches)} of {len(possible_diseases)} diseases by match percentage")
+    return matches
+
+def parse_top_k(value):
+    """Return top_k as an int (None if absent); raise ValueError if it isn't a whole number."""
+    if value is None:
+        return None
+    if isinstance(value, (bool, float)):
+        raise ValueError(f"top_k must be an integer, got {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"top_k must be an integer, got {value!r}") from None
+
+def diagnose_symptoms(data, watch=None):
+    """Diagnose one request body and return the response dict."""
+    if watch is None:
+        watch = PHASE_SECONDS.stopwatch()
+    # Read the index once so a concurrent reload can't mix two versions of the rules
+    symptom_index = current_index()
+    disease_symptoms = symptom_index.disease_symptoms
+    selected_symptoms = set(data.get('symptoms', []))
+    top_k = parse_top_k(data.get('top_k'))
+
+    # Find diseases that match current symptoms
+    possible_diseases = symptom_index.candidates(selected_symptoms)
+    watch.lap('candidates')
+
+    # Calculate matches and confidence
+    matches = calculate_disease_matches(
+        possible_diseases,
+        symptom_index,
+        selected_symptoms,
+        top_k
+    )
+    watch.lap('rank')
+
+    # Get remaining symptoms only if we have possible diseases
+    remaining_symptoms = []
+    if possible_diseases:
+        remaining_symptoms = filter_remaining_symptoms(
+            possible_diseases,
+            disease_symptoms,
+            selected_symptoms
+        )
+    watch.lap('remaining')
+
+    response = {
+        'possible_diseases': [m['disease'] for m in matches],
+        'remaining_symptoms': remaining_symptoms,
+        'is_final_diagnosis': len(remaining_symptoms) == 0 and len(possible_diseases) > 0,
+        'matched_symptoms': len(selected_symptoms),
+        'matches': matches,
+        'symptoms_per_disease': {
+            d: list(disease_symptoms[d])
+            for d in possible_diseases
+        } if possible_diseases else {}
+    }
+
+    # Optionally rank diseases that share only some of the selected symptoms
+    if data.get('partial_matches'):
+        response['partial_matches'] = symptom_index.closest_matches(selected_symptoms, top_k or 10)
+    watch.lap('respond')
+
+    return response
 
 @app.route('/api/get_initial_symptoms', methods=['GET'])
 def get_initial_symptoms():
@@ -95,47 +178,24 @@ def get_initial_symptoms():
 def diagnose():
     """Process symptoms and return diagnosis with filtered symptoms."""
     try:
+        watch = PHASE_SECONDS.stopwatch()
         data = request.get_json()
-        selected_symptoms = set(data.get('symptoms', []))
-        print(f"Selected symptoms for diagnosis: {selected_symptoms}")
-
-        # Find diseases that match current symptoms
-        possible_diseases = []
-        for disease, symptoms in disease_symptoms.items():
-            if selected_symptoms.issubset(symptoms):  # Changed from issuperset to issubset
-                possible_diseases.append(disease)
-                print(f"Possible disease found: {disease}")
-
-        # Calculate matches and confidence
-        matches = calculate_disease_matches(
-            possible_diseases,
-            disease_symptoms,
-            selected_symptoms
-        )
+        print(f"Selected symptoms for diagnosis: {set(data.get('symptoms', []))}")
+        try:
+            parse_top_k(data.get('top_k'))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        watch.lap('parse')
 
-        # Get remaining symptoms only if we have possible diseases
-        remaining_symptoms = []
-        if possible_diseases:
-            remaining_symptoms = filter_remaining_symptoms(
-                possible_diseases,
-                disease_symptoms,
-                selected_symptoms
-            )
-
-        response = {
-            'possible_diseases': [m['disease'] for m in matches],
-            'remaining_symptoms': remaining_symptoms,
-            'is_final_diagnosis': len(remaining_symptoms) == 0 and len(possible_diseases) > 0,
-            'matched_symptoms': len(selected_symptoms),
-            'matches': matches,
-            'symptoms_per_disease': {
-                d: list(disease_symptoms[d])
-                for d in possible_diseases
-            } if possible_diseases else {}
-        }
+        response = diagnose_symptoms(data, watch)
+        for disease in response['possible_diseases']:
+            print(f"Possible disease found: {disease}")
 
         print(f"Diagnosis result: {response}")
-        return jsonify(response)
+        watch.lap('log')
+        result = jsonify(response)
+        watch.lap('jsonify')
+        return result
 
     except Exception as e:
         print(f"Error in diagnosis: {str(e)}")
@@ -148,9 +208,59 @@ def diagnose():
             'symptoms_per_disease': {}
         }), 500
 
+@app.route('/api/diagnose/batch', methods=['POST'])
+def diagnose_batch():
+    """Diagnose many symptom sets in one call, returning results in input order."""
+    try:
+        data = request.get_json()
+        cases = data.get('cases') if isinstance(data, dict) else data
+        if not isinstance(cases, list):
+            return jsonify({'status': 'error', 'message': 'Expected a list of cases'}), 400
+        if len(cases) > BATCH_MAX_ITEMS:
+            return jsonify({'status': 'error', 'message': f'A batch may hold at most {BATCH_MAX_ITEMS} cases'}), 413
+        print(f"Diagnosing batch of {len(cases)} symptom sets")
+
+        results = []
+        for case in cases:
+            try:
+                if isinstance(case, list):
+                    case = {'symptoms': case}
+                results.append(diagnose_symptoms(case))
+            except Exception as e:
+                results.append({'status': 'error', 'message': str(e)})
+
+        return jsonify({'status': 'success', 'results': results})
+
+    except Exception as e:
+        print(f"Error in batch diagnosis: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/kb/version', methods=['GET'])
+def kb_version():
+    """Return the knowledge-base generation this service is serving."""
+    return jsonify({
+        'status': 'success',
+        'generation': kb_watcher.generation,
+        'diseases': len(disease_symptoms)
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Serve the latency histograms in the Prometheus text format."""
+    return render(PHASE_SECONDS, REQUEST_SECONDS), 200, {'Content-Type': CONTENT_TYPE}
+
 if __name__ == '__main__':
     # Load rules at startup
-    rules_text = load_rules(RULES_FILE_PATH)
-    disease_symptoms = parse_rules(rules_text)
+    rules = load_rules(RULES_FILE_PATH)
+    disease_symptoms = parse_rules(rules)
+    symptom_index = SymptomIndex(disease_symptoms)
     print(f"Loaded {len(disease_symptoms)} diseases from rules")
+    kb_watcher = KnowledgeBaseWatcher(
+        os.path.dirname(os.path.abspath(RULES_FILE_PATH)),
+        reload_changed_rules,
+        interval=KB_WATCH_INTERVAL
+    ).start()
     app.run(debug=True)
@@ -0,0 +1,26 @@
+"""Convert rule files to the lean layout by removing the companion printout rules.
+
+    python strip_printouts.py data/disease-symptoms.clp [more.clp ...]
+
+Each file is rewritten in place, atomically. Only rules whose every action
+is a printout are removed; the is_it_ rules, and anything hand-written,
+stay as they are. A knowledge store next to the file rewrites it by itself
+on its next sync when CLP_PRINTOUT_RULES=0; this is for .clp files kept
+elsewhere, such as backups and csv-to-clp output.
+"""
+import argparse
+
+from clp_parser import strip_printout_rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', metavar='FILE')
+    args = parser.parse_args()
+    for path in args.paths:
+        removed = strip_printout_rules(path)
+        print(f"{path}: removed {removed} printout rules")
+
+
+if __name__ == '__main__':
+    main()
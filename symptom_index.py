@@ -0,0 +1,105 @@
+import numpy as np
+
+
+class SymptomIndex:
+    """Posting lists mapping each symptom to the diseases whose rule contains it.
+
+    Diseases are numbered in the order they were parsed, and every posting
+    list is kept in that order, so candidates come back in the same order a
+    scan over the disease_symptoms dict would produce them.
+
+    The same posting lists are also kept as a disease x symptom incidence
+    matrix in compressed-column form (``indptr``/``indices``, one column per
+    integer symptom id), which lets match counts for every disease come out
+    of a single sparse matrix-vector product.
+    """
+
+    def __init__(self, disease_symptoms):
+        self.disease_symptoms = disease_symptoms
+        self.diseases = list(disease_symptoms)
+        self.ordinals = {disease: ordinal for ordinal, disease in enumerate(self.diseases)}
+        self.postings = {}
+        for ordinal, disease in enumerate(self.diseases):
+            for symptom in disease_symptoms[disease]:
+                self.postings.setdefault(symptom, []).append(ordinal)
+
+        self.symptom_ids = {symptom: symptom_id for symptom_id, symptom in enumerate(self.postings)}
+        self.indptr = np.zeros(len(self.symptom_ids) + 1, dtype=np.int64)
+        np.cumsum([len(posting) for posting in self.postings.values()], out=self.indptr[1:])
+        self.indices = np.fromiter(
+            (ordinal for posting in self.postings.values() for ordinal in posting),
+            dtype=np.int64,
+            count=int(self.indptr[-1]),
+        )
+        self.totals = np.fromiter(
+            (len(disease_symptoms[disease]) for disease in self.diseases),
+            dtype=np.int64,
+            count=len(self.diseases),
+        )
+
+    def candidates(self, selected_symptoms):
+        """Return the diseases whose symptoms include every selected symptom."""
+        if not selected_symptoms:
+            return list(self.diseases)
+
+        postings = []
+        for symptom in selected_symptoms:
+            posting = self.postings.get(symptom)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+
+        ordinals = set(postings[0])
+        for posting in postings[1:]:
+            ordinals.intersection_update(posting)
+            if not ordinals:
+                return []
+        return [self.diseases[ordinal] for ordinal in sorted(ordinals)]
+
+    def match_counts(self, selected_symptoms):
+        """Number of selected symptoms each disease contains, indexed by disease ordinal."""
+        columns = [self.symptom_ids[s] for s in set(selected_symptoms) if s in self.symptom_ids]
+        if not columns:
+            return np.zeros(len(self.diseases), dtype=np.int64)
+        rows = np.concatenate([self.indices[self.indptr[c]:self.indptr[c + 1]] for c in columns])
+        return np.bincount(rows, minlength=len(self.diseases))
+
+    def rank(self, ordinals, selected_symptoms, top_k=None):
+        """Score the given diseases by match percentage, best first.
+
+        Ties keep parse order. With ``top_k`` only the best ``top_k`` are
+        returned, selected with argpartition rather than a full sort.
+        """
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        counts = self.match_counts(selected_symptoms)[ordinals]
+        totals = self.totals[ordinals]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentages = np.where(totals > 0, (counts / totals) * 100, 0.0)
+
+        if top_k is not None and top_k < len(ordinals):
+            if top_k <= 0:
+                return []
+            threshold = percentages[np.argpartition(-percentages, top_k - 1)[top_k - 1]]
+            keep = np.flatnonzero(percentages >= threshold)
+            ordinals, counts, totals, percentages = ordinals[keep], counts[keep], totals[keep], percentages[keep]
+
+        order = np.lexsort((ordinals, -percentages))
+        if top_k is not None:
+            order = order[:top_k]
+
+        matches = []
+        for i in order.tolist():
+            total = int(totals[i])
+            matches.append({
+                'disease': self.diseases[ordinals[i]],
+                'match_percentage': float(percentages[i]) if total > 0 else 0,
+                'matched_symptoms': int(counts[i]),
+                'total_symptoms': total
+            })
+        return matches
+
+    def closest_matches(self, selected_symptoms, top_k=10):
+        """Rank every disease sharing at least one selected symptom, not only full matches."""
+        ordinals = np.flatnonzero(self.match_counts(selected_symptoms))
+        return self.rank(ordinals, selected_symptoms, top_k)
@@ -0,0 +1,153 @@
+"""The bitset backend must diagnose what CLIPS diagnoses, fallback rules included.
+
+benchmarks/bitset.py compares the two on a real knowledge base, where
+almost every rule compiles to a bitmask. These tests use a small one
+built around the rules that don't: a rule chained on another rule's
+disease, a rule with a predicate pattern that asserts a symptom, and a
+rule that never stops firing.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitset_engine import BitsetDiagnosis
+from disease_diagnosis import DiseaseDiagnosis
+
+
+RULES = '''
+(deftemplate has_symptom (slot name))
+(deftemplate disease_is (slot name))
+
+(defrule is_it_Flu
+  (has_symptom (name cough))
+  (has_symptom (name fever))
+  =>
+  (assert (disease_is (name Flu))))
+
+(defrule Flu
+  (disease_is (name Flu))
+  =>
+  (printout t "Flu" crlf))
+
+(defrule is_it_Cold
+  (has_symptom (name cough))
+  =>
+  (assert (disease_is (name Cold))))
+
+(defrule is_it_Pneumonia
+  (disease_is (name Flu))
+  (has_symptom (name chest_pain))
+  =>
+  (assert (disease_is (name Pneumonia))))
+
+(defrule is_it_Chills
+  (has_symptom (name ?x&:(eq ?x shivering)))
+  =>
+  (assert (has_symptom (name fever))))
+'''
+
+LOOP = ('(defrule is_it_Loop (has_symptom (name itching)) (has_symptom (name ?x)) '
+        '=> (assert (has_symptom (name (gensym*)))))')
+
+CASES = [
+    ['cough', 'fever'],
+    ['cough', 'fever', 'chest_pain'],
+    ['chest_pain', 'fever'],
+    ['shivering', 'cough'],
+    ['shivering', 'cough', 'chest_pain'],
+    ['shivering'],
+    ['cough'],
+    [],
+]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Engines read data/ under the working directory and keep one store per data directory.
+    os.makedirs(tmp_path / 'data')
+    (tmp_path / 'data' / 'disease-symptoms.clp').write_text(RULES)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / 'data'
+
+
+def diagnose(engine, symptoms):
+    engine.reset()
+    engine.addSymptoms(symptoms)
+    reason = engine.run()
+    return set(engine.getDiseases()), reason
+
+
+def assert_equivalent(clips, bitset, cases=CASES):
+    for symptoms in cases:
+        assert diagnose(bitset, symptoms) == diagnose(clips, symptoms), symptoms
+
+
+def test_fallback_rules_run_in_clips(data_dir):
+    bitset = BitsetDiagnosis()
+    assert sorted(rule.name for rule in bitset._fallback_rules) == ['is_it_Chills', 'is_it_Pneumonia']
+    assert bitset.env is not None
+
+
+@pytest.mark.parametrize('session_facts', [False, True])
+def test_same_diseases_as_clips(data_dir, session_facts):
+    clips = DiseaseDiagnosis(session_facts=session_facts)
+    bitset = BitsetDiagnosis(session_facts=session_facts)
+    assert_equivalent(clips, bitset)
+    # A fallback rule adds fever, which completes a bitmask rule, whose disease completes another fallback rule.
+    assert diagnose(bitset, ['shivering', 'cough', 'chest_pain']) == ({'Flu', 'Cold', 'Pneumonia'}, None)
+
+
+def test_build_rules_recompiles(data_dir):
+    clips = DiseaseDiagnosis()
+    bitset = BitsetDiagnosis()
+    rules = [
+        # A bitmask rule with another symptom.
+        '(defrule is_it_Cold (has_symptom (name cough)) (has_symptom (name sneezing)) '
+        '=> (assert (disease_is (name Cold))))',
+        # A fallback rule that now compiles to a bitmask.
+        '(defrule is_it_Pneumonia (has_symptom (name cough)) (has_symptom (name chest_pain)) '
+        '=> (assert (disease_is (name Pneumonia))))',
+        # A bitmask rule that now needs CLIPS.
+        '(defrule is_it_Flu (has_symptom (name cough)) (has_symptom (name ?x&:(eq ?x fever))) '
+        '=> (assert (disease_is (name Flu))))',
+    ]
+    clips.build_rules(rules)
+    bitset.build_rules(rules)
+    assert sorted(rule.name for rule in bitset._fallback_rules) == ['is_it_Chills', 'is_it_Flu']
+    assert_equivalent(clips, bitset, CASES + [['cough', 'sneezing'], ['sneezing']])
+    assert diagnose(bitset, ['cough'])[0] == set()
+    assert diagnose(bitset, ['cough', 'chest_pain'])[0] == {'Pneumonia'}
+
+
+@pytest.mark.parametrize('engine_class', [DiseaseDiagnosis, BitsetDiagnosis])
+@pytest.mark.parametrize('budget, reason', [({'run_limit': 5000}, 'limit'), ({'run_timeout': 0.2}, 'deadline')])
+@pytest.mark.parametrize('session_facts', [False, True])
+def test_bounded_run(data_dir, engine_class, budget, reason, session_facts):
+    engine = engine_class(session_facts=session_facts, **budget)
+    engine.build_rules([LOOP])
+    diseases, cut_short = diagnose(engine, ['itching', 'cough', 'fever'])
+    assert cut_short == reason
+    assert 'is_it_Loop' in engine.overrun_rules
+    # CLIPS fires the loop ahead of whatever else is on the agenda; the bitmasks all match before it starts.
+    if engine_class is BitsetDiagnosis:
+        assert diseases == {'Flu', 'Cold'}
+    else:
+        assert diseases <= {'Flu', 'Cold'}
+    # The next diagnosis starts clean.
+    assert diagnose(engine, ['cough', 'fever']) == ({'Flu', 'Cold'}, None)
+    assert engine.overrun_rules == []
+
+
+@pytest.mark.parametrize('engine_class', [DiseaseDiagnosis, BitsetDiagnosis])
+@pytest.mark.parametrize('session_facts', [False, True])
+def test_rule_without_patterns(data_dir, engine_class, session_facts):
+    # What the store writes for a disease whose symptoms were all removed: it matches every diagnosis.
+    engine = engine_class(session_facts=session_facts)
+    engine.build_rules(['(defrule is_it_Empty => (assert (disease_is (name Empty))))'])
+    for _ in range(3):
+        assert diagnose(engine, ['cough']) == ({'Cold', 'Empty'}, None)